@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the PassForge generation stages
+
+Runs every stage function, from trivial_pwds to leet_pwds, plus the whole
+pipeline on synthetic Person and Company profiles, each measurement in its own
+process. Reports candidates/s, MB/s, peak RSS and wall time, and writes them to
+JSON so that runs before and after an upgrade can be compared:
+
+    python benchmark.py -o before.json
+    python benchmark.py -o after.json --compare before.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+import passforge
+
+# Words used to build the synthetic keyword sets
+WORDS = [
+    "travel", "football", "summer", "guitar", "coffee", "ocean", "dragon", "pizza",
+    "matrix", "winter", "rocket", "sunset", "forest", "tiger", "falcon", "cookie",
+    "marvel", "shadow", "silver", "thunder", "garden", "castle", "mountain", "river",
+    "phoenix", "dolphin", "cherry", "soccer", "hunter", "diamond", "eagle", "jungle",
+    "planet", "monkey", "purple", "legend", "wizard", "canyon", "breeze", "galaxy",
+]
+
+# Keywords of each synthetic profile, from small to very large
+PROFILES = {
+    "small": 0,
+    "medium": 5,
+    "large": 20,
+    "xlarge": 50,
+}
+
+STAGES = [
+    "trivial_pwds",
+    "common_passwords",
+    "permutations_first_round",
+    "permutations_second_round",
+    "permutations_third_round",
+    "passphrases",
+    "advanced_patterns_passwords",
+    "ultra_advanced_passwords",
+    "leet_pwds",
+    "leet_pwds_all",
+    "pipeline",
+]
+
+
+def keywords(count):
+    """count distinct synthetic keywords."""
+    return [WORDS[i % len(WORDS)] + (str(i // len(WORDS)) if i >= len(WORDS) else "") for i in range(count)]
+
+
+def make_target(profile):
+    """Synthetic target of a profile name; "company-<size>" builds a Company."""
+    kind, _, size = profile.rpartition("-")
+    if kind == "company":
+        return passforge.Company(
+            name="Acme",
+            web_domain="acme.com",
+            birth_year="1998",
+            company_keywords=keywords(PROFILES[size]) or None,
+        )
+    return passforge.Person(
+        name="Alice",
+        middle_name="Marie",
+        surname="Johnson",
+        nickname="ali",
+        username="alicej",
+        age="34",
+        birth_day="15",
+        birth_month="03",
+        birth_year="1990",
+        email="alice@example.com",
+        birth_place="Boston",
+        first_pet="Luna",
+        second_pet="Max",
+        favourite_band="Queen",
+        person_keywords=keywords(PROFILES[size]) or None,
+    )
+
+
+def stage_candidates(stage, target, years, numbers):
+    """Return the generator measured for stage (inputs are built beforehand)."""
+    attributes = passforge.attr_keywords_in_unique_list(target)
+    subsets = passforge.create_permutations_with_repetition(attributes, passforge.words_in_passphrase_max)
+    if stage in ("trivial_pwds", "common_passwords"):
+        return getattr(passforge, stage)(attributes, years, numbers)
+    if stage.startswith("permutations_"):
+        return getattr(passforge, stage)(subsets, years, numbers)
+    if stage == "passphrases":
+        # 3-word passphrases; the sample keeps the xlarge profiles under the guard
+        passforge.passphrase_words = 3
+        passforge.passphrase_sample = True
+        return passforge.passphrases(attributes, years, numbers)
+    if stage in ("advanced_patterns_passwords", "ultra_advanced_passwords"):
+        return getattr(passforge, stage)(attributes, target)
+    # leet over the trivial passwords, materialized before the clock starts
+    pwds = list(passforge.trivial_pwds(attributes, years, numbers))
+    return passforge.leet_pwds(stage == "leet_pwds_all", pwds)
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KB, None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(task):
+    """Worker: run one stage of one profile and return its measurement."""
+    profile, stage, years, numbers = task
+    target = make_target(profile)
+    passforge.transform_cache = passforge.TransformCache()
+
+    if stage == "pipeline":
+        args = passforge.get_parser().parse_args(["-p"] + (["-y"] if years else []) + (["-n"] if numbers else []))
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            start = time.perf_counter()
+            candidates = passforge.generate_passwords(target, os.devnull, args)
+            seconds = time.perf_counter() - start
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        size = None
+    else:
+        passwords = stage_candidates(stage, target, years, numbers)
+        candidates = size = 0
+        start = time.perf_counter()
+        for password in passwords:
+            candidates += 1
+            size += len(password.encode("utf-8")) + 1
+        seconds = time.perf_counter() - start
+
+    return {
+        "profile": profile,
+        "stage": stage,
+        "candidates": candidates,
+        "bytes": size,
+        "seconds": round(seconds, 6),
+        "candidates_per_sec": round(candidates / seconds) if seconds else None,
+        "mb_per_sec": round(size / seconds / 1024 / 1024, 3) if size is not None and seconds else None,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def compare(results, baseline_file):
+    """Print the candidates/s change of every measurement against a previous run."""
+    with open(baseline_file) as f:
+        baseline = {(r["profile"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_file}:")
+    for result in results:
+        before = baseline.get((result["profile"], result["stage"]))
+        if not before or not before["candidates_per_sec"] or not result["candidates_per_sec"]:
+            continue
+        change = (result["candidates_per_sec"] / before["candidates_per_sec"] - 1) * 100
+        print(f"  {result['profile']:<16}{result['stage']:<30}{change:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PassForge generation stages")
+    parser.add_argument(
+        "--profiles",
+        default="small,medium,large,xlarge,company-small,company-large",
+        help="Comma separated profiles: small, medium, large, xlarge, or company-<size>.",
+    )
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help="Comma separated stages to run (default: all).",
+    )
+    parser.add_argument("--no-years", action="store_true", help="Run the stages without -y")
+    parser.add_argument("--no-numbers", action="store_true", help="Run the stages without -n")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="JSON results file")
+    parser.add_argument("--compare", metavar="JSON", help="Previous results to compare with")
+    args = parser.parse_args()
+
+    profiles = [profile.strip() for profile in args.profiles.split(",") if profile.strip()]
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    for profile in profiles:
+        if profile.rpartition("-")[2] not in PROFILES:
+            parser.error(f"unknown profile '{profile}'")
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f"unknown stage '{stage}'")
+
+    tasks = [(profile, stage, not args.no_years, not args.no_numbers) for profile in profiles for stage in stages]
+    print(f"{'Profile':<16}{'Stage':<30}{'Candidates':>14}{'Cand/s':>14}{'MB/s':>10}{'RSS MB':>10}{'Time s':>10}")
+    results = []
+    # one fresh process per measurement, so peak RSS belongs to that stage alone
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(measure, tasks):
+            results.append(result)
+            mb_per_sec = "-" if result["mb_per_sec"] is None else f"{result['mb_per_sec']:.1f}"
+            rss = "-" if result["peak_rss_kb"] is None else f"{result['peak_rss_kb'] / 1024:.0f}"
+            print(f"{result['profile']:<16}{result['stage']:<30}{result['candidates']:>14,}"
+                  f"{result['candidates_per_sec'] or 0:>14,}{mb_per_sec:>10}{rss:>10}{result['seconds']:>10.2f}")
+
+    report = {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "years": not args.no_years,
+        "numbers": not args.no_numbers,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
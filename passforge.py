@@ -26,9 +26,33 @@
 # ----- Import libraries -----
 
 import argparse
+import bz2
+import cProfile
+import contextlib
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import linecache
+import math
+import lzma
 import os
+import pstats
 import itertools
+import multiprocessing
+import operator
+import queue
+import random
+import re
+import shutil
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict, deque
 
 # ----- ANSI Color Codes -----
 
@@ -81,21 +105,128 @@ leet_chars:
     'z': '2',}
 """
 directory = "output"
+STDOUT = "-"  # -o value that streams the passwords to stdout
 starting_year = 1985
 ending_year = 1999
 starting_number = 1
 ending_number = 20
-words_in_passphrase_max = 2  # HIGHLY recommended: _don't_ edit this
+words_in_passphrase_max = 2  # HIGHLY recommended: _don't_ edit this (see --words)
+passphrase_words = 2  # --words: 3 or 4 adds the passphrases stage
+passphrase_separators = [""]  # --separators: put between the words of a passphrase
+passphrase_limit = 10_000_000  # --max-passphrases: keyspace guard of the passphrases stage
+passphrase_sample = False  # --sample: sample passphrase_limit passphrases over the guard
+password_policy = None  # --policy spec, see PasswordPolicy
 min_pwd_length = 0
+max_pwd_length = None  # None = no maximum length
+dedup_memory_mb = 256  # memory for --dedup before spilling to disk
+leet_max_substitutions = None  # --leetall: max substituted chars per word (None = all)
+leet_word_budget = None  # --leetall: max variations per word (None = unlimited)
+workers = 1  # processes used by the heavy permutation rounds
+buffer_size_kb = 1024  # size of the output batches, see BatchWriter
+
+# Globals tuned by main() that worker processes must inherit
+RUNTIME_SETTINGS = (
+    "min_pwd_length",
+    "max_pwd_length",
+    "buffer_size_kb",
+    "leet_max_substitutions",
+    "leet_word_budget",
+    "dedup_memory_mb",
+    "passphrase_words",
+    "passphrase_separators",
+    "passphrase_limit",
+    "passphrase_sample",
+    "password_policy",
+)
 
 # Length constants for password generation
 SYMBOL_LENGTH = 1
-YEAR_LENGTH = 4
-MAX_NUMBER_LENGTH = 2  # Max digits in numbers (1-20)
+
+# Output extensions compressed on the fly, see open_output()
+COMPRESSORS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+# Batches queued for the compression thread before generation waits for it
+WRITER_QUEUE_SIZE = 8
+
+# Per-word transform results kept by TransformCache before evicting the oldest
+TRANSFORM_CACHE_SIZE = 4096
+
+# Options replayed by --resume, see Checkpoint
+CHECKPOINT_OPTIONS = ("years", "numbers", "leet", "leetall", "ranked")
+# Seconds between two checkpoints of a resumable run, see Checkpoint
+CHECKPOINT_INTERVAL = 30
+# Candidates fed to the sink between two checkpoint clock checks
+CHECKPOINT_CHUNK = 4096
+
+# --policy: character classes, as (class, its complement) for the regular expression
+POLICY_CLASSES = {
+    "upper": ("A-Z", "^A-Z"),
+    "lower": ("a-z", "^a-z"),
+    "digit": ("0-9", "^0-9"),
+    "symbol": ("^A-Za-z0-9", "A-Za-z0-9"),  # anything else
+}
+
+# --words: longest passphrase, every extra word multiplies the keyspace
+PASSPHRASE_MAX_WORDS = 4
+# --sample: seed of the passphrase sample, so a resumed run draws the same one
+PASSPHRASE_SAMPLE_SEED = 1337
+
+# --profile: allocation lines and functions listed per stage in the report
+PROFILE_TOP = 15
+
+# --check-hashes: hex digest length -> unsalted hashlib algorithm
+HASH_ALGORITHMS = {32: "md5", 40: "sha1", 64: "sha256"}
+# --check-hashes: candidates hashed per worker task
+HASH_BATCH_LINES = 8192
+
+# Lines moved at once by BatchWriter.writelines()
+BATCH_CHUNK_LINES = 4096
+
+# --estimate: candidates of the advanced and ultra stages measured at once
+ESTIMATE_CHUNK = 65536
+
+# Approximate bookkeeping cost (bytes) of one string held by the deduplicator
+DEDUP_ENTRY_OVERHEAD = 64
+
+# --limit/--time-limit give these cheap, high-yield stages no share: they run
+# first and only --limit itself stops them, keeping room for the ones still to run
+PROTECTED_STAGES = ("trivial", "common")
+
+# Candidates written between two clock checks of --time-limit
+TIME_CHECK_INTERVAL = 256
+
+# --ranked and --limit/--time-limit: how likely a password of each stage is
+STAGE_WEIGHTS = {
+    "trivial": 1.0,         # Name, name!, Name!1, name.1990
+    "common": 0.9,          # password, 123456, qwerty
+    "advanced": 0.7,        # name123, Name2024, 1990name, summer1990
+    "permutations_1": 0.6,  # namesurname, namesurname1
+    "ultra": 0.4,           # phonetic variations, mutations
+    "permutations_2": 0.3,  # name.surname1, namesurname!1990
+    "passphrases": 0.2,     # namesurnamepet, name-surname-pet1990
+    "permutations_3": 0.1,  # name?surname%1999
+}
+# --ranked: how likely each target field is to appear in a password
+ATTRIBUTE_WEIGHTS = {
+    "name": 1.0,
+    "nickname": 1.0,
+    "username": 0.9,
+    "first_pet": 0.9,
+    "surname": 0.8,
+    "second_pet": 0.8,
+    "birth_year": 0.8,
+    "favourite_band": 0.7,
+    "person_keywords": 0.7,
+    "company_keywords": 0.7,
+    "web_domain": 0.6,
+    "middle_name": 0.5,
+    "birth_place": 0.5,
+}
+DEFAULT_ATTRIBUTE_WEIGHT = 0.3  # age, birth day/month, email, ...
 
 # Advanced password generation patterns
 COMMON_SUFFIXES = ["123", "!", "@", "#", "1", "12", "123!", "!@#", "2024", "2025", "321"]
 COMMON_PREFIXES = ["!", "@", "my", "the", "i", "love"]
+SPECIAL_MULTIPLIERS = ["!", "!!", "!!!", "@", "#", "*", "!@", "!@#", "@#$"]
 KEYBOARD_PATTERNS = [
     "qwerty", "qwertyuiop", "asdf", "asdfgh", "zxcv", "zxcvbn",
     "qwerty123", "1qaz2wsx", "1q2w3e4r", "!qaz@wsx", "1234qwer"
@@ -129,43 +260,45 @@ PHONETIC_REPLACEMENTS = {
     'tion': 'shun', # action -> akshun
 }
 
-# Common password patterns from real-world analysis
+# Common password patterns from real-world analysis, as (prefix, base, suffix).
+# base is "word", "capitalized" or "double"; "{year}" and "{yy}" stand for the
+# birth year and its last two digits, patterns using them need a birth year.
 COMMON_PASSWORD_PATTERNS = [
     # Year patterns
-    lambda w, y: f"{w}{y}" if y else None,
-    lambda w, y: f"{w.capitalize()}{y}" if y else None,
-    lambda w, y: f"{w}{str(y)[-2:]}" if y else None,
+    ("", "word", "{year}"),
+    ("", "capitalized", "{year}"),
+    ("", "word", "{yy}"),
     
     # Number patterns
-    lambda w, _: f"{w}1",
-    lambda w, _: f"{w}123",
-    lambda w, _: f"{w}1234",
-    lambda w, _: f"{w}12345",
-    lambda w, _: f"{w}01",
-    lambda w, _: f"{w}00",
-    lambda w, _: f"1{w}",
+    ("", "word", "1"),
+    ("", "word", "123"),
+    ("", "word", "1234"),
+    ("", "word", "12345"),
+    ("", "word", "01"),
+    ("", "word", "00"),
+    ("1", "word", ""),
     
     # Symbol patterns (most common positions)
-    lambda w, _: f"{w}!",
-    lambda w, _: f"{w}@",
-    lambda w, _: f"{w}#",
-    lambda w, _: f"{w}$",
-    lambda w, _: f"{w}.",
-    lambda w, _: f"{w}_",
-    lambda w, _: f"{w}!1",
-    lambda w, _: f"{w}@1",
-    lambda w, _: f"{w}#1",
+    ("", "word", "!"),
+    ("", "word", "@"),
+    ("", "word", "#"),
+    ("", "word", "$"),
+    ("", "word", "."),
+    ("", "word", "_"),
+    ("", "word", "!1"),
+    ("", "word", "@1"),
+    ("", "word", "#1"),
     
     # Capitalization + symbol/number
-    lambda w, _: f"{w.capitalize()}!",
-    lambda w, _: f"{w.capitalize()}@",
-    lambda w, _: f"{w.capitalize()}1",
-    lambda w, _: f"{w.capitalize()}123",
+    ("", "capitalized", "!"),
+    ("", "capitalized", "@"),
+    ("", "capitalized", "1"),
+    ("", "capitalized", "123"),
     
     # Double patterns
-    lambda w, _: f"{w}{w}",
-    lambda w, _: f"{w}{w}1",
-    lambda w, _: f"{w}{w}!",
+    ("", "double", ""),
+    ("", "double", "1"),
+    ("", "double", "!"),
 ]
 
 
@@ -249,6 +382,171 @@ def get_parser():
         type=str,
         help="Set the minimum length for passwords (default 0).",
     )
+    parser.add_argument(
+        "-M",
+        "--maxlength",
+        type=int,
+        help="Set the maximum length for passwords (default no maximum).",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="PATH",
+        help="Write the passwords to PATH instead of output/<name>.txt. Use - to stream them to stdout, "
+             "a .gz, .bz2 or .xz extension to compress them.",
+    )
+    parser.add_argument(
+        "--targets",
+        metavar="FILE",
+        help="Non-interactive batch mode: one person/company per record of a JSON lines, "
+             "JSON or CSV file, generated in parallel into output/ (existing files are overwritten).",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="PATH",
+        help="Continue an interrupted run from the checkpoint saved next to its output file PATH.",
+    )
+    shard_group = parser.add_mutually_exclusive_group(required=False)
+    shard_group.add_argument(
+        "--shards",
+        type=int,
+        metavar="K",
+        help="Split the output round-robin into K files <name>.000.txt ... plus a manifest.",
+    )
+    shard_group.add_argument(
+        "--shard-lines",
+        type=int,
+        metavar="N",
+        help="Split the output into files of N lines <name>.000.txt ... plus a manifest.",
+    )
+    parser.add_argument(
+        "--policy",
+        metavar="RULES",
+        help="Only keep passwords a target policy accepts, e.g. \"min=8,max=16,upper,digit,symbol\": "
+             "min/max length, upper/lower/digit/symbol[=N] (at least N of them) and classes=N "
+             "(at least N of the 4 classes). Stages that cannot meet it are skipped.",
+    )
+    parser.add_argument(
+        "--words",
+        type=int,
+        metavar="N",
+        help=f"Add passphrases of 3 up to N words (at most {PASSPHRASE_MAX_WORDS}), "
+             "with an optional number or year at the end.",
+    )
+    parser.add_argument(
+        "--separators",
+        metavar="CHARS",
+        help="With --words, also join the words of a passphrase with each of CHARS; "
+             "write --separators=-_. when CHARS starts with a dash.",
+    )
+    parser.add_argument(
+        "--max-passphrases",
+        type=int,
+        metavar="N",
+        help=f"With --words, refuse to run over N passphrases (default {passphrase_limit:,}).",
+    )
+    parser.add_argument(
+        "--sample",
+        action="store_true",
+        help="With --words, write an even sample of --max-passphrases passphrases instead of refusing.",
+    )
+    parser.add_argument(
+        "--ranked",
+        action="store_true",
+        help="Write the most likely passwords first, scored by pattern and attribute "
+             "(--workers is not used).",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        metavar="N",
+        help="Write at most N passwords; trivial and common passwords always come first, "
+             "the other stages share the rest by priority.",
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        metavar="S",
+        help="Stop generating after S seconds, sharing the time between stages like --limit.",
+    )
+    parser.add_argument(
+        "--stats",
+        metavar="JSON",
+        help="Write per-stage statistics (generated, filtered, duplicates, written, bytes, "
+             "transform cache hits/misses, time) to JSON and print a summary table. "
+             "With --targets, <list>.stats.json per target.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Run every stage under cProfile and tracemalloc: writes <output>.<stage>.prof files "
+             "and an <output>.profile.txt report (slows generation down).",
+    )
+    parser.add_argument(
+        "--check-hashes",
+        metavar="FILE",
+        help="Hash every candidate (MD5, SHA1 or SHA256, unsalted) against the hex digests of FILE "
+             "with a process pool instead of writing the list; cracked digest:password pairs go "
+             "to the output and the run stops once every hash is cracked.",
+    )
+    parser.add_argument(
+        "--emit-rules",
+        action="store_true",
+        help="Write the base words and a hashcat/John <name>.rule file that expands them, plus the "
+             "common, date, month/season and keyboard passwords in <name>.static.txt, instead of the "
+             "expanded passwords. Word combinations and ultra-advanced patterns are not exported. "
+             "-m/-M only filter <name>.static.txt, the rules can build passwords outside them; "
+             "--limit and --time-limit are not applied and -L is refused.",
+    )
+    parser.add_argument(
+        "--emit-masks",
+        action="store_true",
+        help="With -y/-n, write the bases that take a number or year to <name>.hybrid.txt and "
+             "hashcat masks for the ranges to <name>.hcmask, instead of expanding them (hashcat -a 6). "
+             "Bases taking other masks (third round, -m/-M) get <name>.hybrid-2.txt and <name>-2.hcmask, ...",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Only print how many passwords each stage would generate, without generating them",
+    )
+    parser.add_argument(
+        "--leet-max-subs",
+        type=int,
+        metavar="K",
+        help="With -L, substitute at most K characters per password (k-hop leet).",
+    )
+    parser.add_argument(
+        "--leet-budget",
+        type=int,
+        metavar="N",
+        help="With -L, keep at most N leet variations per password (besides its lowercased form), "
+             "fewest substitutions first.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="Generate the heavy permutation rounds with N processes (default 1).",
+    )
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        metavar="KB",
+        help=f"Size of the batches written to the output (default {buffer_size_kb}).",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Remove duplicate passwords across all the generation stages",
+    )
+    parser.add_argument(
+        "--dedup-memory",
+        type=int,
+        metavar="MB",
+        help=f"Memory used by --dedup before spilling to disk (default {dedup_memory_mb}); "
+             "spilled candidates are written at the end, out of --ranked order.",
+    )
 
     return parser
 
@@ -261,22 +559,114 @@ def create_output_folder():
         os.makedirs(directory)
 
 
-def create_output_file(input_filename):
+def create_output_file(input_filename, output=None, sharded=False):
+    """
+    Prepare the output file and return its path.
+    input_filename is created inside the output directory unless output (-o)
+    overrides it. STDOUT ("-") needs no file at all. A sharded output is only
+    checked through its manifest, shards are created while writing.
+    """
+    if output == STDOUT:
+        return output
 
-    create_output_folder()
-    filename = os.path.join(directory, input_filename)
+    if output:
+        filename = output
+        if os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+    else:
+        create_output_folder()
+        filename = os.path.join(directory, input_filename)
 
-    if os.path.exists(filename):
+    existing = manifest_path(filename) if sharded else filename
+    if os.path.exists(existing):
         choice = input(
-            f"{Colors.WARNING}[!] {input_filename} already exists. Do you want to overwrite? (y/n):{Colors.RESET} "
+            f"{Colors.WARNING}[!] {existing} already exists. Do you want to overwrite? (y/n):{Colors.RESET} "
         )
         if str(choice).lower() != "y":
             print(f"{Colors.ERROR}✗ Operation cancelled.{Colors.RESET}")
             sys.exit(1)
         # if choice == y: ====> go forward. The file's content will be flushed and overwritten
-    else:
+    elif not sharded:
         open(filename, 'a').close()
 
+    return filename
+
+
+class BackgroundWriter:
+    """
+    Binary stream handing every write() to a background thread through a
+    bounded queue, so slow sinks (compression) overlap with generation.
+    """
+
+    def __init__(self, stream, max_pending=WRITER_QUEUE_SIZE):
+        self.stream = stream
+        self.queue = queue.Queue(max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            try:
+                if data is None:
+                    return
+                if self.error is None:
+                    self.stream.write(data)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def write(self, data):
+        self._raise_error()
+        self.queue.put(data)
+
+    def flush(self):
+        """Wait until the thread has written everything queued so far."""
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.stream.close()
+        self._raise_error()
+
+
+@contextlib.contextmanager
+def open_output(output_file, offset=None):
+    """
+    Open output_file as a binary stream. STDOUT streams to the real stdout and
+    names ending in .gz, .bz2 or .xz are compressed on a background thread.
+    With an offset (--resume), a plain file is cut there and appended to.
+    """
+    if offset is not None:
+        with open(output_file, "r+b") as f:
+            f.truncate(offset)
+            f.seek(offset)
+            yield f
+        return
+
+    if output_file == STDOUT:
+        yield sys.__stdout__.buffer
+        return
+
+    compressor = COMPRESSORS.get(os.path.splitext(output_file)[1].lower())
+    if compressor:
+        stream = BackgroundWriter(compressor(output_file, "wb"))
+        try:
+            yield stream
+        finally:
+            stream.close()
+    else:
+        with open(output_file, "wb") as f:
+            yield f
+
 
 def prepare_keywords(str_input):
     """
@@ -295,38 +685,46 @@ def prepare_keywords(str_input):
 
 def create_permutations_with_repetition(list_input, k):
     """
-    It returns all the permutations with repetitions (with k elements) of list_input
+    It returns an iterator over all the permutations with repetitions (with k elements) of list_input
     """
-    unique_words = set(list_input)
-    subsets = [p for p in itertools.product(unique_words, repeat=k)]
-
-    return subsets
+    unique_words = dict.fromkeys(list_input)  # first-seen order, so runs can be resumed
+    # lazy: the product of a long keyword list does not fit in memory
+    return itertools.product(unique_words, repeat=k)
 
 
 def flush_None_values(list_input):
     return [elem for elem in list_input if elem is not None and elem != ""]
 
 
+def length_fits(length):
+    """True if a password of this length is inside the -m/--maxlength window."""
+    return length >= min_pwd_length and (max_pwd_length is None or length <= max_pwd_length)
+
+
+def fitting(suffixes, base_length):
+    """Keep the suffixes that give a password inside the length window when added to base_length."""
+    return [suffix for suffix in suffixes if length_fits(base_length + len(suffix))]
+
+
 def has_case_variations(text):
     """Check if text has letters that can be capitalized differently."""
     return text.lower() != text.capitalize()
 
 
-def write_with_case_variations(file_handle, text, suffix=""):
+def case_variations(text, suffix=""):
     """
-    Write text with case variations (lower, upper, capitalize) if applicable.
+    Yield text with case variations (lower, upper, capitalize) if applicable.
     
     Args:
-        file_handle: Open file handle to write to
-        text: Base text to write
+        text: Base text to vary
         suffix: Optional suffix to append (e.g., symbol, number, year)
     """
     if has_case_variations(text):
-        file_handle.write(f"{text.lower()}{suffix}\n")
-        file_handle.write(f"{text.upper()}{suffix}\n")
-        file_handle.write(f"{text.capitalize()}{suffix}\n")
+        yield f"{text.lower()}{suffix}"
+        yield f"{text.upper()}{suffix}"
+        yield f"{text.capitalize()}{suffix}"
     else:
-        file_handle.write(f"{text}{suffix}\n")
+        yield f"{text}{suffix}"
 
 
 def attr_keywords_in_unique_list(target):
@@ -344,11 +742,115 @@ def attr_keywords_in_unique_list(target):
     attributes.extend(keywords)
     #  now attributes == all attributes + keywords
 
-    result = list(set(attributes))
+    result = list(dict.fromkeys(attributes))  # unique, in a stable order
 
     return result
 
 
+# ----- Password policy -----
+
+
+class PasswordPolicy:
+    """
+    --policy, e.g. "min=8,max=16,upper,digit=2,symbol" or "min=8,classes=3":
+    min/max length, at least N characters of a class (N defaults to 1) and at
+    least N different classes out of upper, lower, digit and symbol.
+
+    The class counts are compiled into one regular expression of lookaheads,
+    so checking a candidate is a single call into the re engine. Lengths are
+    left to the -m/-M window, which the stages already prune by.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.min_length = 0
+        self.max_length = None
+        self.required = {}
+        self.classes = 0
+        for rule in filter(None, (rule.strip() for rule in spec.split(","))):
+            name, _, value = rule.partition("=")
+            name = name.strip().lower()
+            try:
+                number = int(value) if value else 1
+            except ValueError:
+                raise ValueError(f"'{rule}' needs an integer") from None
+            if number < 0 or (name == "max" and number <= 0):
+                raise ValueError(f"'{rule}' needs a positive integer")
+            if name == "min":
+                self.min_length = number
+            elif name == "max":
+                self.max_length = number
+            elif name == "classes":
+                self.classes = min(number, len(POLICY_CLASSES))
+            elif name in POLICY_CLASSES:
+                if number:
+                    self.required[name] = number
+                else:
+                    self.required.pop(name, None)  # upper=0: no requirement
+            else:
+                raise ValueError(f"unknown rule '{name}' (min, max, classes, {', '.join(POLICY_CLASSES)})")
+        if self.max_length is not None and self.max_length < self.min_length:
+            raise ValueError("max is smaller than min")
+
+        lookaheads = "".join(
+            f"(?=(?:[{POLICY_CLASSES[name][1]}]*[{POLICY_CLASSES[name][0]}]){{{count}}})"
+            for name, count in self.required.items()
+        )
+        self.match = re.compile(lookaheads).match if lookaheads else None
+        self.searches = {name: re.compile(f"[{chars}]").search for name, (chars, _) in POLICY_CLASSES.items()}
+
+    def __call__(self, password):
+        """True if password meets the class rules (lengths aside)."""
+        if self.match and not self.match(password):
+            return False
+        return not self.classes or sum(1 for search in self.searches.values() if search(password)) >= self.classes
+
+    def classes_of(self, text):
+        """The classes that have a character in text."""
+        return {name for name, search in self.searches.items() if search(text)}
+
+    def satisfiable(self, classes):
+        """False if no candidate made only of these classes can meet the policy."""
+        return set(self.required) <= classes and len(classes) >= self.classes
+
+
+def compiled_policy():
+    """The PasswordPolicy of --policy, None without one."""
+    return PasswordPolicy(password_policy) if password_policy else None
+
+
+def policy_skipped_stages(attributes, years, numbers, leet):
+    """
+    Names of the stages that cannot produce a single candidate meeting --policy,
+    from the classes their words, affixes and case variations can bring in.
+    The advanced and ultra stages mix too many patterns to be ruled out.
+    """
+    policy = compiled_policy()
+    if policy is None:
+        return set()
+
+    words = policy.classes_of("".join(attributes))
+    if any(has_case_variations(word) for word in attributes):
+        cased = words | {"upper", "lower"}  # case variations of the leading word
+    else:
+        cased = words
+    tails = {"digit"} if years or numbers else set()
+    extra = {"digit"} if leet else set()  # leet turns letters into digits
+
+    common = policy.classes_of("".join(common_pwds))
+    separators = policy.classes_of("".join(passphrase_separators))
+    stages = {
+        "trivial": cased | {"symbol"} | tails,
+        "common": common,
+        "permutations_1": cased | tails,
+        "permutations_2": cased | {"symbol"} | tails,
+        "permutations_3": cased | {"symbol"} | tails,
+    }
+    if passphrase_words > 2:
+        stages["passphrases"] = words | separators | tails
+    return {name for name, classes in stages.items() if not policy.satisfiable(classes | extra)}
+
+
 # ----- Advanced Password Generation Functions -----
 
 
@@ -366,13 +868,13 @@ def add_common_patterns(word):
     patterns = []
     
     # Common suffixes
-    for suffix in COMMON_SUFFIXES:
+    for suffix in fitting(COMMON_SUFFIXES, len(word)):
         patterns.append(f"{word}{suffix}")
         if has_case_variations(word):
             patterns.append(f"{word.capitalize()}{suffix}")
     
     # Common prefixes
-    for prefix in COMMON_PREFIXES:
+    for prefix in fitting(COMMON_PREFIXES, len(word)):
         patterns.append(f"{prefix}{word}")
         if has_case_variations(word):
             patterns.append(f"{prefix}{word.capitalize()}")
@@ -382,18 +884,7 @@ def add_common_patterns(word):
 
 def add_special_multipliers(word):
     """Add common special character patterns at end."""
-    patterns = [
-        f"{word}!",
-        f"{word}!!",
-        f"{word}!!!",
-        f"{word}@",
-        f"{word}#",
-        f"{word}*",
-        f"{word}!@",
-        f"{word}!@#",
-        f"{word}@#$",
-    ]
-    return patterns
+    return [f"{word}{multiplier}" for multiplier in fitting(SPECIAL_MULTIPLIERS, len(word))]
 
 
 def advanced_capitalization(word):
@@ -415,7 +906,7 @@ def advanced_capitalization(word):
         mid = len(word) // 2
         variations.append(word[:mid].lower() + word[mid:].upper())
     
-    return list(set(variations))
+    return list(dict.fromkeys(variations))
 
 
 def generate_date_variations(day, month, year):
@@ -464,14 +955,14 @@ def generate_temporal_passwords(name, birth_year=None):
         return passwords
     
     # Month combinations
-    for month in MONTHS_SHORT:
+    for month in fitting(MONTHS_SHORT, len(name)):
         passwords.append(f"{name}{month}")
         passwords.append(f"{month}{name}")
         if has_case_variations(name):
             passwords.append(f"{name.capitalize()}{month}")
     
     # Season combinations
-    for season in SEASONS:
+    for season in fitting(SEASONS, len(name)):
         passwords.append(f"{name}{season}")
         passwords.append(f"{season}{name}")
         if has_case_variations(name):
@@ -521,7 +1012,7 @@ def advanced_substitutions(word):
         if has_case_variations(word):
             variations.append(multi_sub.capitalize())
     
-    return list(set(variations))
+    return list(dict.fromkeys(variations))
 
 
 def phonetic_variations(word):
@@ -553,7 +1044,7 @@ def phonetic_variations(word):
         if has_case_variations(word):
             variations.append(k_version.capitalize())
     
-    return list(set(variations))
+    return list(dict.fromkeys(variations))
 
 
 def word_mutations(word):
@@ -597,7 +1088,7 @@ def word_mutations(word):
     if no_vowels and len(no_vowels) >= 2:
         mutations.append(no_vowels)
     
-    return list(set(mutations))
+    return list(dict.fromkeys(mutations))
 
 
 def ml_pattern_analysis(word, birth_year=None):
@@ -609,369 +1100,2340 @@ def ml_pattern_analysis(word, birth_year=None):
         return []
     
     patterns = []
+    word_length = len(word)
     
-    # Apply each pattern function
-    for pattern_func in COMMON_PASSWORD_PATTERNS:
-        try:
-            result = pattern_func(word, birth_year)
-            if result and len(result) >= min_pwd_length:
-                patterns.append(result)
-        except:
-            continue
+    # Apply each common pattern whose length fits the window
+    bases = {"word": word, "capitalized": word.capitalize(), "double": word * 2}
+    years = {"{year}": str(birth_year), "{yy}": str(birth_year)[-2:]} if birth_year else {}
+    for prefix, base, suffix in COMMON_PASSWORD_PATTERNS:
+        if suffix.startswith("{"):
+            if suffix not in years:
+                continue
+            suffix = years[suffix]
+        if length_fits(len(prefix) + len(bases[base]) + len(suffix)):
+            patterns.append(f"{prefix}{bases[base]}{suffix}")
     
     # Additional ML-observed patterns
     word_lower = word.lower()
     
     # Common transformations from password analysis
     # 1. First letter upper + numbers at end (most common pattern)
-    patterns.extend([
-        f"{word.capitalize()}1!",
-        f"{word.capitalize()}2024",
-        f"{word.capitalize()}2025",
-        f"{word.capitalize()}@123",
-    ])
+    patterns.extend(f"{word.capitalize()}{suffix}"
+                    for suffix in fitting(["1!", "2024", "2025", "@123"], word_length))
     
     # 2. All caps + exclamation (aggressive passwords)
-    patterns.append(f"{word.upper()}!")
-    patterns.append(f"{word.upper()}!!")
+    patterns.extend(f"{word.upper()}{suffix}" for suffix in fitting(["!", "!!"], word_length))
     
     # 3. Sandwich patterns (symbol-word-symbol)
-    patterns.extend([
-        f"!{word}!",
-        f"@{word}@",
-        f"#{word}#",
-        f"*{word}*",
-    ])
+    if length_fits(word_length + 2):
+        patterns.extend(f"{symbol}{word}{symbol}" for symbol in "!@#*")
     
     # 4. Year in middle (less common but exists)
-    if birth_year:
-        patterns.append(f"{word[:len(word)//2]}{birth_year}{word[len(word)//2:]}")
+    if birth_year and length_fits(word_length + len(str(birth_year))):
+        patterns.append(f"{word[:word_length//2]}{birth_year}{word[word_length//2:]}")
     
     # 5. Alternating case (less common but seen in analysis)
-    if len(word) > 3:
+    if word_length > 3:
         alternating = ''.join([c.upper() if i % 2 == 0 else c.lower() 
                               for i, c in enumerate(word)])
-        patterns.append(alternating)
-        patterns.append(f"{alternating}1")
+        patterns.extend(f"{alternating}{suffix}" for suffix in fitting(["", "1"], word_length))
     
     # 6. Reverse with number (creative users)
-    patterns.append(f"{word[::-1]}1")
-    patterns.append(f"{word[::-1]}!")
+    patterns.extend(f"{word[::-1]}{suffix}" for suffix in fitting(["1", "!"], word_length))
     
     # 7. Keyboard adjacent characters (typo-based)
     # Common typos: a->s, e->r, i->o, etc.
-    typo_map = {'a': 's', 'e': 'r', 'i': 'o', 's': 'a', 'o': 'i'}
-    for old_char, new_char in typo_map.items():
-        if old_char in word_lower:
-            typo_version = word_lower.replace(old_char, new_char, 1)  # Replace first occurrence
-            if typo_version != word_lower:
-                patterns.append(typo_version)
+    if length_fits(word_length):
+        typo_map = {'a': 's', 'e': 'r', 'i': 'o', 's': 'a', 'o': 'i'}
+        for old_char, new_char in typo_map.items():
+            if old_char in word_lower:
+                typo_version = word_lower.replace(old_char, new_char, 1)  # Replace first occurrence
+                if typo_version != word_lower:
+                    patterns.append(typo_version)
     
-    return list(set([p for p in patterns if p and len(p) >= min_pwd_length]))
+    return list(dict.fromkeys(patterns))
 
 
-def trivial_pwds(attributes, years, numbers, output_file):
+class TransformCache:
     """
-    Write trivial passwords to output file.
-    Generates passwords from attributes with optional symbols, numbers, and years.
+    Run-scoped LRU cache of the per-word transforms used by the advanced and
+    ultra stages, keyed by (transform, word, -m/-M window, birth_year) since
+    some transforms prune by length. Results are stored as tuples, every
+    (transform, word) pair is computed once per run.
     """
-    with open(output_file, "w") as f:
-        for elem in attributes:
-            if len(elem) >= min_pwd_length:
-                f.write(f"{elem}\n")
 
-            for symbol in symbols:
-                # Symbol and attribute
-                if len(elem) + SYMBOL_LENGTH >= min_pwd_length:
-                    write_with_case_variations(f, elem, symbol)
+    def __init__(self, max_entries=TRANSFORM_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, transform, word, *args):
+        key = (transform.__name__, word, min_pwd_length, max_pwd_length) + args
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
 
-                # Symbol, attribute and number
-                if numbers and len(elem) + SYMBOL_LENGTH + MAX_NUMBER_LENGTH >= min_pwd_length:
-                    for number in range(starting_number, ending_number + 1):
-                        write_with_case_variations(f, elem, f"{symbol}{number}")
+        self.misses += 1
+        result = tuple(transform(word, *args))
+        self.entries[key] = result
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return result
+
+
+transform_cache = TransformCache()
+
+
+def cached(transform, word, *args):
+    """transform(word, *args) through the run's TransformCache."""
+    return transform_cache.get(transform, word, *args)
+
+
+def number_suffixes(numbers, first=None, last=None):
+    """The -n number range as strings (empty if numbers is off)."""
+    if not numbers:
+        return []
+    first = starting_number if first is None else first
+    last = ending_number if last is None else last
+    return [str(number) for number in range(first, last + 1)]
 
-                # Symbol, attribute and year
-                if years and len(elem) + SYMBOL_LENGTH + YEAR_LENGTH >= min_pwd_length:
-                    for year in range(starting_year, ending_year + 1):
-                        write_with_case_variations(f, elem, f"{symbol}{year}")
 
+def year_suffixes(years):
+    """The -y year range as strings (empty if years is off)."""
+    return [str(year) for year in range(starting_year, ending_year + 1)] if years else []
 
-def permutations_first_round(attributes, years, numbers, output_file):
+
+def case_variants(text):
+    """The case variations of text, in the order case_variations() yields them."""
+    if has_case_variations(text):
+        return (text.lower(), text.upper(), text.capitalize())
+    return (text,)
+
+
+def combine(variants, suffixes):
     """
-    Write first round of word combinations.
-    - word1 + word2
-    - word1 + word2 + number
-    - word1 + word2 + year
+    Yield variant + suffix for every suffix and, for each suffix, every variant
+    (the order of case_variations()). The concatenations run in map() over
+    prebuilt tables instead of formatting every candidate in a Python loop.
     """
-    subsets = create_permutations_with_repetition(attributes, words_in_passphrase_max)
+    if len(variants) == 1:
+        return map(variants[0].__add__, suffixes)
+    repeated = itertools.chain.from_iterable(map(itertools.repeat, suffixes, itertools.repeat(len(variants))))
+    return map(operator.add, itertools.cycle(variants), repeated)
 
-    with open(output_file, "a") as f:
-        for subset in subsets:
-            # ATTENTION - THIS WORKS WITH words_in_passphrase_max = 2 ONLY !
-            word1, word2 = subset
 
-            # word1 + word2
-            if len(word1) + len(word2) >= min_pwd_length:
-                write_with_case_variations(f, word1, word2)
+class SuffixTables:
+    """
+    Suffix tables of a combination stage, built once per base length.
+    build(base_length) returns the suffixes that fit the length window after
+    a base of that length; words of the same length share the table.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.tables = {}
 
-            # word1 + word2 + number
-            if numbers and len(word1) + len(word2) + MAX_NUMBER_LENGTH >= min_pwd_length:
-                for number in range(starting_number, ending_number + 1):
-                    write_with_case_variations(f, word1, f"{word2}{number}")
+    def __call__(self, base_length):
+        table = self.tables.get(base_length)
+        if table is None:
+            table = self.tables[base_length] = self.build(base_length)
+        return table
 
-            # word1 + word2 + year
-            if years and len(word1) + len(word2) + YEAR_LENGTH >= min_pwd_length:
-                for year in range(starting_year, ending_year + 1):
-                    write_with_case_variations(f, word1, f"{word2}{year}")
 
-    return subsets
+def trivial_builder(years, numbers):
+    """passwords(word) of trivial_pwds(), the suffix tables shared by every word."""
+    all_numbers = number_suffixes(numbers)
+    all_years = year_suffixes(years)
 
+    def build(base_length):
+        # symbol, symbol + number, symbol + year: for every symbol
+        base = base_length + SYMBOL_LENGTH
+        tails = ([""] if length_fits(base) else []) + fitting(all_numbers, base) + fitting(all_years, base)
+        return [symbol + tail for symbol in symbols for tail in tails]
 
-def permutations_second_round(subsets, years, numbers, output_file):
+    tables = SuffixTables(build)
+
+    def passwords(elem):
+        return itertools.chain((elem,), combine(case_variants(elem), tables(len(elem))))
+
+    return passwords
+
+
+def trivial_pwds(attributes, years, numbers):
+    """
+    Return an iterator over the trivial passwords.
+    Generates passwords from attributes with optional symbols, numbers, and years.
+    Numbers and years that cannot fit the length window are never formatted.
+    """
+    return itertools.chain.from_iterable(map(trivial_builder(years, numbers), attributes))
+
+
+def first_round_builder(years, numbers):
+    """passwords((word1, word2)) of permutations_first_round(), the suffix tables shared by every pair."""
+    all_numbers = number_suffixes(numbers)
+    all_years = year_suffixes(years)
+    tables = SuffixTables(lambda base: ([""] if length_fits(base) else []) + fitting(all_numbers, base)
+                          + fitting(all_years, base))
+    variants = {}
+
+    def passwords(subset):
+        # the rounds pair two words, longer phrases are the passphrases stage
+        word1, word2 = subset
+        tails = tables(len(word1) + len(word2))
+        if not tails:
+            return ()
+        if word1 not in variants:
+            variants[word1] = case_variants(word1)
+        return combine(variants[word1], [word2 + tail for tail in tails])
+
+    return passwords
+
+
+def permutations_first_round(subsets, years, numbers):
     """
-    Write second round of word combinations with symbols.
+    Return an iterator over the first round of word combinations.
+    - word1 + word2
+    - word1 + word2 + number
+    - word1 + word2 + year
+    """
+    return itertools.chain.from_iterable(map(first_round_builder(years, numbers), subsets))
+
+
+def second_round_builder(years, numbers):
+    """passwords((word1, word2)) of permutations_second_round(), the suffix tables shared by every pair."""
+    all_numbers = number_suffixes(numbers)
+    all_years = year_suffixes(years)
+    tables = SuffixTables(lambda base: (length_fits(base), fitting(all_numbers, base) + fitting(all_years, base)))
+    variants = {}
+
+    def passwords(subset):
+        # the rounds pair two words, longer phrases are the passphrases stage
+        word1, word2 = subset
+        symbol_fits, tails = tables(len(word1) + len(word2) + SYMBOL_LENGTH)
+        if not (symbol_fits or tails):
+            return ()
+        if word1 not in variants:
+            variants[word1] = case_variants(word1)
+
+        suffixes = []
+        for symbol in symbols:
+            before, after = symbol + word2, word2 + symbol
+            if symbol_fits:
+                suffixes.append(before)
+            # number or year, with the symbol on either side of word2
+            for tail in tails:
+                suffixes.append(before + tail)
+                suffixes.append(after + tail)
+        return combine(variants[word1], suffixes)
+
+    return passwords
+
+
+def permutations_second_round(subsets, years, numbers):
+    """
+    Return an iterator over the second round of word combinations with symbols.
     - word1 + symbol + word2
     - word1 + symbol + word2 + number
     - word1 + word2 + symbol + number
     - word1 + symbol + word2 + year
     - word1 + word2 + symbol + year
     """
-    with open(output_file, "a") as f:
-        for subset in subsets:
-            # ATTENTION - THIS WORKS WITH words_in_passphrase_max = 2 ONLY !
-            word1, word2 = subset
+    return itertools.chain.from_iterable(map(second_round_builder(years, numbers), subsets))
+
+
+def third_round_builder(years, numbers):
+    """passwords((word1, word2)) of permutations_third_round(), the suffix tables shared by every pair."""
+    all_numbers = number_suffixes(numbers, starting_number, starting_number)
+    all_years = year_suffixes(years)
+
+    def build(base_length):
+        # symbol2 + number, symbol2 + year: for every symbol2
+        tails = fitting(all_numbers, base_length) + fitting(all_years, base_length)
+        return [symbol2 + tail for symbol2 in symbols for tail in tails]
+
+    tables = SuffixTables(build)
+    variants = {}
+
+    def passwords(subset):
+        # the rounds pair two words, longer phrases are the passphrases stage
+        word1, word2 = subset
+        tails = tables(len(word1) + len(word2) + 2 * SYMBOL_LENGTH)
+        if not tails:
+            return ()
+        if word1 not in variants:
+            variants[word1] = case_variants(word1)
+        suffixes = []
+        for symbol in symbols:
+            middle = symbol + word2
+            suffixes.extend([middle + tail for tail in tails])
+        return combine(variants[word1], suffixes)
 
-            for symbol in symbols:
-                # word1 + symbol + word2
-                if len(word1) + len(word2) + SYMBOL_LENGTH >= min_pwd_length:
-                    write_with_case_variations(f, word1, f"{symbol}{word2}")
-
-                # word1 + symbol + word2 + number (two positions)
-                if numbers and len(word1) + len(word2) + SYMBOL_LENGTH + MAX_NUMBER_LENGTH >= min_pwd_length:
-                    for number in range(starting_number, ending_number + 1):
-                        write_with_case_variations(f, word1, f"{symbol}{word2}{number}")
-                        write_with_case_variations(f, word1, f"{word2}{symbol}{number}")
-
-                # word1 + symbol + word2 + year (two positions)
-                if years and len(word1) + len(word2) + SYMBOL_LENGTH + YEAR_LENGTH >= min_pwd_length:
-                    for year in range(starting_year, ending_year + 1):
-                        write_with_case_variations(f, word1, f"{symbol}{word2}{year}")
-                        write_with_case_variations(f, word1, f"{word2}{symbol}{year}")
+    return passwords
 
 
-def permutations_third_round(subsets, years, numbers, output_file):
+def permutations_third_round(subsets, years, numbers):
     """
-    Write third round of word combinations with two symbols.
+    Return an iterator over the third round of word combinations with two symbols.
     - word1 + symbol + word2 + symbol2 + number
     - word1 + symbol + word2 + symbol2 + year
     """
-    with open(output_file, "a") as f:
-        for subset in subsets:
-            # ATTENTION - THIS WORKS WITH words_in_passphrase_max = 2 ONLY !
-            word1, word2 = subset
+    return itertools.chain.from_iterable(map(third_round_builder(years, numbers), subsets))
+
+
+class KeyspaceTooLarge(ValueError):
+    """The passphrases stage is over --max-passphrases and --sample is off."""
+
+
+def passphrase_tails(years, numbers):
+    """What can end a passphrase: nothing, a -n number or a -y year."""
+    return [""] + number_suffixes(numbers) + year_suffixes(years)
+
+
+def passphrase_count(attributes, years, numbers):
+    """Number of passphrases of 3 to passphrase_words words, before the length window."""
+    words = len(dict.fromkeys(attributes))
+    phrases = sum(words ** k for k in range(3, passphrase_words + 1))
+    return phrases * len(passphrase_separators) * len(passphrase_tails(years, numbers))
 
-            for symbol in symbols:
-                for symbol2 in symbols:
-                    # word1 + symbol + word2 + symbol2 + number
-                    if numbers and len(word1) + len(word2) + (2 * SYMBOL_LENGTH) + MAX_NUMBER_LENGTH >= min_pwd_length:
-                        for number in range(starting_number, starting_number + 1):
-                            write_with_case_variations(f, word1, f"{symbol}{word2}{symbol2}{number}")
 
-                    # word1 + symbol + word2 + symbol2 + year
-                    if years and len(word1) + len(word2) + (2 * SYMBOL_LENGTH) + YEAR_LENGTH >= min_pwd_length:
-                        for year in range(starting_year, ending_year + 1):
-                            write_with_case_variations(f, word1, f"{symbol}{word2}{symbol2}{year}")
+def check_passphrase_keyspace(attributes, years, numbers):
+    """Refuse a passphrases stage over passphrase_limit, unless it is sampled."""
+    total = passphrase_count(attributes, years, numbers)
+    if total > passphrase_limit and not passphrase_sample:
+        raise KeyspaceTooLarge(
+            f"{total:,} passphrases of up to {passphrase_words} words is over --max-passphrases "
+            f"{passphrase_limit:,}: use fewer words, separators or keywords, raise the limit "
+            f"or add --sample"
+        )
 
 
-def common_passwords(attributes, years, numbers, output_file):
+def passphrases(attributes, years, numbers):
+    """
+    Return an iterator over the passphrases of 3 to passphrase_words words.
+    - word1 + separator + word2 + separator + word3
+    - word1 + separator + word2 + separator + word3 + number
+    - word1 + separator + word2 + separator + word3 + year
+    and the same with a fourth word. Words are taken as given and every gap
+    gets the same separator. The product is walked lazily; over
+    passphrase_limit candidates, passphrase_limit of them are sampled with
+    --sample and KeyspaceTooLarge is raised without.
+    """
+    check_passphrase_keyspace(attributes, years, numbers)
+    words = list(dict.fromkeys(attributes))
+    tails = passphrase_tails(years, numbers)
+    total = passphrase_count(words, years, numbers)
+    if total > passphrase_limit:
+        return sampled_passphrases(words, tails, total)
+
+    tables = SuffixTables(lambda base: fitting(tails, base))
+
+    def passwords(phrase):
+        return map(phrase.__add__, tables(len(phrase)))
+
+    phrases = (
+        separator.join(subset)
+        for k in range(3, passphrase_words + 1)
+        for subset in itertools.product(words, repeat=k)
+        for separator in passphrase_separators
+    )
+    return itertools.chain.from_iterable(map(passwords, phrases))
+
+
+def sampled_passphrases(words, tails, total):
+    """
+    Yield passphrase_limit passphrases spread evenly over the total ones of
+    passphrases(), in the same order. Candidate number i is decoded from i
+    (word count, words, separator, tail), so nothing is enumerated to reach it.
     """
-    Write common passwords to output file.
+    shift = random.Random(PASSPHRASE_SAMPLE_SEED).randrange(total)
+    blocks = [(k, len(words) ** k * len(passphrase_separators) * len(tails))
+              for k in range(3, passphrase_words + 1)]
+    for j in range(passphrase_limit):
+        # one candidate in every total / passphrase_limit, at a random offset
+        index = (j * total + shift) // passphrase_limit
+        for k, block in blocks:
+            if index < block:
+                break
+            index -= block
+        index, tail = divmod(index, len(tails))
+        index, separator = divmod(index, len(passphrase_separators))
+        subset = []
+        for _ in range(k):
+            index, word = divmod(index, len(words))
+            subset.append(words[word])
+        yield passphrase_separators[separator].join(reversed(subset)) + tails[tail]
+
+
+def common_passwords(attributes, years, numbers):
+    """
+    Yield common passwords.
     Includes standard passwords like 'password', 'admin', '123456', etc.
     """
-    with open(output_file, "a") as f:
-        for elem in common_pwds:
-            if len(elem) >= min_pwd_length:
-                f.write(f"{elem}\n")
+    yield from common_pwds
+
 
+def date_passwords(target):
+    """Yield the birth date formats, alone and next to the name and surname."""
+    if hasattr(target, 'birth_day') and hasattr(target, 'birth_month') and hasattr(target, 'birth_year'):
+        date_formats = generate_date_variations(
+            target.birth_day,
+            target.birth_month,
+            target.birth_year
+        )
+        for date_fmt in date_formats:
+            if len(date_fmt) >= min_pwd_length:
+                yield date_fmt
+
+                # Combine dates with names
+                if hasattr(target, 'name') and target.name:
+                    yield f"{target.name}{date_fmt}"
+                    yield f"{date_fmt}{target.name}"
+                    if hasattr(target, 'surname') and target.surname:
+                        yield f"{target.surname}{date_fmt}"
+                        yield f"{date_fmt}{target.surname}"
+
+
+def temporal_passwords(target):
+    """Yield the month and season patterns of the name and surname."""
+    if hasattr(target, 'name') and target.name:
+        birth_year = target.birth_year if hasattr(target, 'birth_year') else None
+        yield from cached(generate_temporal_passwords, target.name, birth_year)
 
-def advanced_patterns_passwords(attributes, target, output_file):
+        # Also for surname
+        if hasattr(target, 'surname') and target.surname:
+            yield from cached(generate_temporal_passwords, target.surname, birth_year)
+
+
+def advanced_patterns_passwords(attributes, target):
     """
-    Write advanced password patterns to output file.
-    Includes: reverse words, common patterns, special multipliers, 
-    advanced capitalization, date variations, temporal passwords, 
+    Yield advanced password patterns.
+    Includes: reverse words, common patterns, special multipliers,
+    advanced capitalization, date variations, temporal passwords,
     advanced substitutions, and keyboard patterns.
     """
-    with open(output_file, "a") as f:
-        # 1. Reverse words
-        reversed_words = add_reverse_words(attributes)
-        for word in reversed_words:
-            if len(word) >= min_pwd_length:
-                f.write(f"{word}\n")
-        
-        # 2. Common patterns (suffixes/prefixes)
-        for word in attributes:
-            patterns = add_common_patterns(word)
-            for pattern in patterns:
-                if len(pattern) >= min_pwd_length:
-                    f.write(f"{pattern}\n")
-        
-        # 3. Special multipliers
-        for word in attributes:
-            multipliers = add_special_multipliers(word)
-            for mult in multipliers:
-                if len(mult) >= min_pwd_length:
-                    f.write(f"{mult}\n")
-        
-        # 4. Advanced capitalization
-        for word in attributes:
-            if len(word) > 3:
-                caps = advanced_capitalization(word)
-                for cap in caps:
-                    if len(cap) >= min_pwd_length:
-                        f.write(f"{cap}\n")
-        
-        # 5. Date variations
-        if hasattr(target, 'birth_day') and hasattr(target, 'birth_month') and hasattr(target, 'birth_year'):
-            date_formats = generate_date_variations(
-                target.birth_day, 
-                target.birth_month, 
-                target.birth_year
-            )
-            for date_fmt in date_formats:
-                if len(date_fmt) >= min_pwd_length:
-                    f.write(f"{date_fmt}\n")
-                    
-                    # Combine dates with names
-                    if hasattr(target, 'name') and target.name:
-                        f.write(f"{target.name}{date_fmt}\n")
-                        f.write(f"{date_fmt}{target.name}\n")
-                        if hasattr(target, 'surname') and target.surname:
-                            f.write(f"{target.surname}{date_fmt}\n")
-                            f.write(f"{date_fmt}{target.surname}\n")
-        
-        # 6. Temporal passwords (seasons/months)
-        if hasattr(target, 'name') and target.name:
-            birth_year = target.birth_year if hasattr(target, 'birth_year') else None
-            temporal = generate_temporal_passwords(target.name, birth_year)
-            for temp in temporal:
-                if len(temp) >= min_pwd_length:
-                    f.write(f"{temp}\n")
-            
-            # Also for surname
-            if hasattr(target, 'surname') and target.surname:
-                temporal_surname = generate_temporal_passwords(target.surname, birth_year)
-                for temp in temporal_surname:
-                    if len(temp) >= min_pwd_length:
-                        f.write(f"{temp}\n")
-        
-        # 7. Advanced substitutions
-        for word in attributes:
-            subs = advanced_substitutions(word)
-            for sub in subs:
-                if len(sub) >= min_pwd_length:
-                    f.write(f"{sub}\n")
-        
-        # 8. Keyboard patterns
-        for pattern in KEYBOARD_PATTERNS:
-            if len(pattern) >= min_pwd_length:
-                f.write(f"{pattern}\n")
-
-
-def ultra_advanced_passwords(attributes, target, output_file):
-    """
-    Write ultra-advanced password patterns to output file.
+    # 1. Reverse words
+    yield from add_reverse_words(attributes)
+
+    # capitalization and substitutions keep the word length
+    same_length = [word for word in attributes if length_fits(len(word))]
+
+    # 2. Common patterns (suffixes/prefixes)
+    for word in attributes:
+        yield from cached(add_common_patterns, word)
+
+    # 3. Special multipliers
+    for word in attributes:
+        yield from cached(add_special_multipliers, word)
+
+    # 4. Advanced capitalization
+    for word in same_length:
+        if len(word) > 3:
+            yield from cached(advanced_capitalization, word)
+
+    # 5. Date variations
+    yield from date_passwords(target)
+
+    # 6. Temporal passwords (seasons/months)
+    yield from temporal_passwords(target)
+
+    # 7. Advanced substitutions
+    for word in same_length:
+        yield from cached(advanced_substitutions, word)
+
+    # 8. Keyboard patterns
+    yield from KEYBOARD_PATTERNS
+
+
+def ultra_advanced_passwords(attributes, target):
+    """
+    Yield ultra-advanced password patterns.
     Includes: phonetic variations, word mutations, and ML-based pattern analysis.
     """
-    with open(output_file, "a") as f:
-        birth_year = target.birth_year if hasattr(target, 'birth_year') else None
-        
-        # 1. Phonetic variations
-        for word in attributes:
-            phonetics = phonetic_variations(word)
-            for phonetic in phonetics:
-                if len(phonetic) >= min_pwd_length:
-                    f.write(f"{phonetic}\n")
-                    # Also add with common suffixes
-                    f.write(f"{phonetic}123\n")
-                    f.write(f"{phonetic}!\n")
-                    if birth_year:
-                        f.write(f"{phonetic}{birth_year}\n")
-        
-        # 2. Word mutations
-        for word in attributes:
-            mutations = word_mutations(word)
-            for mutation in mutations:
-                if len(mutation) >= min_pwd_length:
-                    f.write(f"{mutation}\n")
-                    # Add with common patterns
-                    f.write(f"{mutation}1\n")
-                    f.write(f"{mutation}!\n")
-                    if has_case_variations(mutation):
-                        f.write(f"{mutation.capitalize()}\n")
-                        f.write(f"{mutation.capitalize()}1\n")
-        
-        # 3. ML-based pattern analysis
-        for word in attributes:
-            ml_patterns = ml_pattern_analysis(word, birth_year)
-            for pattern in ml_patterns:
-                if len(pattern) >= min_pwd_length:
-                    f.write(f"{pattern}\n")
-        
-        # 4. Combined advanced patterns
-        # Phonetic + mutations
-        for word in attributes:
-            phonetics = phonetic_variations(word)
-            for phonetic in phonetics:
-                mutations = word_mutations(phonetic)
-                for mutation in mutations:
-                    if len(mutation) >= min_pwd_length:
-                        f.write(f"{mutation}\n")
-        
-        # 5. ML patterns on phonetic variations
-        for word in attributes:
-            phonetics = phonetic_variations(word)
-            for phonetic in phonetics:
-                ml_patterns = ml_pattern_analysis(phonetic, birth_year)
-                for pattern in ml_patterns:
-                    if len(pattern) >= min_pwd_length:
-                        f.write(f"{pattern}\n")
-
-
-def leet_pwds(leetall, output_file):
-    """
-    Generate 1337 (leet) speak passwords.
-    
+    birth_year = target.birth_year if hasattr(target, 'birth_year') else None
+    phonetic_suffixes = ["123", "!"] + ([str(birth_year)] if birth_year else [])
+
+    # 1. Phonetic variations
+    for word in attributes:
+        phonetics = cached(phonetic_variations, word)
+        for phonetic in phonetics:
+            if len(phonetic) >= min_pwd_length:
+                yield phonetic
+                # Also add with common suffixes
+                for suffix in fitting(phonetic_suffixes, len(phonetic)):
+                    yield f"{phonetic}{suffix}"
+
+    # 2. Word mutations
+    for word in attributes:
+        mutations = cached(word_mutations, word)
+        for mutation in mutations:
+            if len(mutation) >= min_pwd_length:
+                yield mutation
+                # Add with common patterns
+                for suffix in fitting(["1", "!"], len(mutation)):
+                    yield f"{mutation}{suffix}"
+                if has_case_variations(mutation):
+                    yield mutation.capitalize()
+                    if length_fits(len(mutation) + 1):
+                        yield f"{mutation.capitalize()}1"
+
+    # 3. ML-based pattern analysis
+    for word in attributes:
+        yield from cached(ml_pattern_analysis, word, birth_year)
+
+    # 4. Combined advanced patterns
+    # Phonetic + mutations
+    for word in attributes:
+        phonetics = cached(phonetic_variations, word)
+        for phonetic in phonetics:
+            yield from cached(word_mutations, phonetic)
+
+    # 5. ML patterns on phonetic variations
+    for word in attributes:
+        phonetics = cached(phonetic_variations, word)
+        for phonetic in phonetics:
+            yield from cached(ml_pattern_analysis, phonetic, birth_year)
+
+
+def leet_combinations(word, max_substitutions=None):
+    """
+    Lazily yield leet combinations of word ordered by number of substitutions:
+    the word itself, then every single substitution, then every pair, ...
+    Stops after max_substitutions substitutions when given (k-hop leet).
+    """
+    positions = [i for i, char in enumerate(word) if char in leet_chars]
+    max_k = len(positions)
+    if max_substitutions is not None:
+        max_k = min(max_k, max_substitutions)
+
+    for k in range(max_k + 1):
+        for chosen in itertools.combinations(positions, k):
+            chars = list(word)
+            for i in chosen:
+                chars[i] = leet_chars[chars[i]]
+            yield "".join(chars)
+
+
+def leet_variations(elem, leetall):
+    """
+    Yield the 1337 (leet) speak variations of a single password.
+
     Args:
+        elem: Password to transform
         leetall: If True, generate all possible leet combinations (e.g., leet -> l3e7)
                  If False, replace all leet chars (e.g., leet -> l337)
-        output_file: Path to output file
     """
-    # Read existing passwords
-    with open(output_file, "r") as f:
-        pwds = f.read().split()
+    # Check if password contains leet-able characters
+    if not any(key in elem for key in leet_chars.keys()):
+        return
+
+    if leetall:
+        # Generate all possible leet combinations, fewest substitutions first;
+        # the budget counts substituted variations, not the lowercased password
+        variations = leet_combinations(elem.lower(), leet_max_substitutions)
+        yield from itertools.islice(variations, None if leet_word_budget is None else leet_word_budget + 1)
+    else:
+        # Replace all leet chars
+        leet = elem
+        for char, replacement in leet_chars.items():
+            leet = leet.replace(char, replacement)
+        yield leet
 
-    with open(output_file, "a") as f:
-        for elem in pwds:
-            # Check if password contains leet-able characters
-            if not any(key in elem for key in leet_chars.keys()):
-                continue
 
-            if leetall:
-                # Generate all possible leet combinations
-                possibles = []
-                for lower in elem.lower():
-                    ll = leet_chars.get(lower, lower)
-                    possibles.append((lower,) if ll == lower else (lower, ll))
+def leet_pwds(leetall, pwds):
+    """
+    Yield 1337 (leet) speak passwords for every password in pwds.
+    Works as a streaming transform: pwds can be any iterable, e.g. a stage.
+    """
+    for elem in pwds:
+        yield from leet_variations(elem, leetall)
+
+
+# ----- Parallel generation -----
+
+
+def runtime_settings():
+    """Snapshot of the globals main() tuned, to be replayed in worker processes."""
+    module = sys.modules[__name__]
+    return {name: getattr(module, name) for name in RUNTIME_SETTINGS}
+
 
-                leets = ["".join(t) for t in itertools.product(*possibles)]
-                for leet in leets:
-                    f.write(f"{leet}\n")
+def apply_runtime_settings(settings):
+    """Pool initializer: spawned workers start from the defaults otherwise."""
+    module = sys.modules[__name__]
+    for name, value in settings.items():
+        setattr(module, name, value)
+
+
+def split_by_first_word(subsets):
+    """Split subsets into consecutive chunks sharing the same first word."""
+    return [list(group) for _, group in itertools.groupby(subsets, key=lambda subset: subset[0])]
+
+
+def _permutations_shard(task):
+    """
+    Worker: write one round for one chunk of subsets into its own shard file.
+    Returns (shard path, lines written, candidates generated). With
+    filter_length, only the candidates inside the length window are written.
+    """
+    round_function, subsets, years, numbers, shard_path, filter_length = task
+    passwords = round_function(subsets, years, numbers)
+    pulled = itertools.count()
+    if filter_length:
+        passwords = map(operator.itemgetter(0), zip(passwords, pulled))
+        passwords = (password for password in passwords if length_fits(len(password)))
+    with open(shard_path, "wb") as f:
+        writer = BatchWriter(f)
+        written = writer.writelines(passwords)
+        writer.flush()
+    return shard_path, written, next(pulled) if filter_length else written
+
+
+class ParallelRound:
+    """
+    Iterator over the passwords of a permutation round computed by a process
+    pool. Subsets are split by their first word, every worker writes its own
+    shard of encoded lines and shards are consumed in subset order, so the
+    output is identical to round_function(subsets, years, numbers).
+
+    Iterating parses the shards back into lines for the sink. When the sink
+    has no per-line work to do, write_to() copies the shards straight to the
+    output instead, and the length window is applied inside the workers.
+    """
+
+    def __init__(self, round_function, subsets, years, numbers, processes):
+        self.round_function = round_function
+        self.subsets = subsets
+        self.years = years
+        self.numbers = numbers
+        self.processes = processes
+        self.lines = None
+
+    def shards(self, filter_length):
+        """Yield (open shard file, lines, candidates generated) in subset order."""
+        shard_dir = tempfile.mkdtemp(prefix="passforge-shards-")
+        tasks = (
+            (self.round_function, chunk, self.years, self.numbers,
+             os.path.join(shard_dir, f"shard-{index:06d}.txt"), filter_length)
+            for index, chunk in enumerate(split_by_first_word(self.subsets))
+        )
+        try:
+            with multiprocessing.Pool(self.processes, apply_runtime_settings, (runtime_settings(),)) as pool:
+                for shard_path, lines, pulled in pool.imap(_permutations_shard, tasks):
+                    with open(shard_path, "rb") as f:
+                        yield f, lines, pulled
+                    os.remove(shard_path)
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+    def _read_lines(self):
+        for f, _, _ in self.shards(filter_length=False):
+            text = io.TextIOWrapper(f, encoding="utf-8", newline="\n")
+            yield from map(operator.methodcaller("rstrip", "\n"), text)
+            text.detach()
+
+    def __iter__(self):
+        # the line generator itself, so consumers do not go through __next__ per line
+        if self.lines is None:
+            self.lines = self._read_lines()
+        return self.lines
+
+    def __next__(self):
+        return next(iter(self))
+
+    def close(self):
+        if self.lines is not None:
+            self.lines.close()
+
+    def write_to(self, sink):
+        """
+        Copy the shards to the sink's output as they are (see copies_blocks()),
+        yielding the number of candidates behind every shard.
+        """
+        for f, lines, pulled in self.shards(filter_length=True):
+            sink.write_block(f, lines, pulled)
+            yield pulled
+
+
+def parallel_round(round_function, subsets, years, numbers, processes):
+    """The passwords of a permutation round computed by a process pool, see ParallelRound."""
+    return ParallelRound(round_function, subsets, years, numbers, processes)
+
+
+# ----- Output -----
+
+
+class BatchWriter:
+    """
+    Line writer for binary streams.
+    Lines are encoded in chunks and collected into a batch which is written
+    with a single write() once it holds about buffer_size bytes, instead of
+    encoding and writing every line on its own.
+    """
+
+    def __init__(self, stream, buffer_size=None):
+        self.stream = stream
+        self.buffer_size = buffer_size or buffer_size_kb * 1024
+        self.lines = []  # single lines from write(), not encoded yet
+        self.batch = []
+        self.batch_size = 0
+        self.encoded = 0  # bytes encoded so far, written or batched
+        self.done = False  # a line writer can end the run early, see HashChecker
+
+    @property
+    def bytes(self):
+        """Bytes of every line accepted so far."""
+        self._encode_lines()
+        return self.encoded
+
+    def write(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= BATCH_CHUNK_LINES:
+            self._encode_lines()
+
+    def writelines(self, lines):
+        """Write every line of an iterable in bulk. Returns the number of lines."""
+        self._encode_lines()
+        lines = iter(lines)
+        written = 0
+        while True:
+            chunk = list(itertools.islice(lines, BATCH_CHUNK_LINES))
+            if not chunk:
+                return written
+            written += len(chunk)
+            chunk.append("")
+            self._add("\n".join(chunk).encode("utf-8"))
+
+    def _encode_lines(self):
+        if self.lines:
+            lines, self.lines = self.lines, []
+            lines.append("")
+            self._add("\n".join(lines).encode("utf-8"))
+
+    def _add(self, data):
+        self.batch.append(data)
+        self.batch_size += len(data)
+        self.encoded += len(data)
+        if self.batch_size >= self.buffer_size:
+            self._write_batch()
+
+    def _write_batch(self):
+        if self.batch:
+            self.stream.write(b"".join(self.batch))
+            self.batch = []
+            self.batch_size = 0
+
+    def write_file(self, f):
+        """Copy the encoded lines of the binary file f to the stream."""
+        self._encode_lines()
+        self._write_batch()
+        start = f.tell()
+        shutil.copyfileobj(f, self.stream, self.buffer_size)
+        self.encoded += f.tell() - start
+
+    def flush(self):
+        self._encode_lines()
+        self._write_batch()
+        self.stream.flush()
+
+
+class Deduplicator:
+    """
+    Remove duplicates across the whole run.
+
+    Candidates are remembered in a hash set while it fits in memory_limit bytes.
+    Past that point new candidates are spilled to sorted run files on disk and
+    merged with heapq on drain(), so memory stays bounded whatever the list size.
+    """
+
+    def __init__(self, memory_limit):
+        self.memory_limit = memory_limit
+        self.seen = set()
+        self.used = 0
+        self.spill_dir = None
+        self.buffer = []
+        self.buffer_used = 0
+        self.pending_runs = []
+        self.emitted_runs = []
+        self.dropped = 0
+
+    @property
+    def spilling(self):
+        return self.spill_dir is not None
+
+    def add(self, password):
+        """
+        Register a candidate.
+        Returns "new" if it must be written now, "spilled" if it was deferred
+        to disk and None if it is a duplicate.
+        """
+        if password in self.seen:
+            self.dropped += 1
+            return None
+
+        size = sys.getsizeof(password) + DEDUP_ENTRY_OVERHEAD
+        if not self.spilling:
+            if self.used + size <= self.memory_limit // 2:
+                self.seen.add(password)
+                self.used += size
+                return "new"
+            self.spill_dir = tempfile.mkdtemp(prefix="passforge-dedup-")
+
+        self.buffer.append(password)
+        self.buffer_used += size
+        if self.buffer_used >= self.memory_limit // 2:
+            self._flush_buffer()
+        return "spilled"
+
+    def _new_run_path(self):
+        return os.path.join(self.spill_dir, f"run-{len(self.pending_runs) + len(self.emitted_runs):06d}.txt")
+
+    def _flush_buffer(self):
+        if not self.buffer:
+            return
+        path = self._new_run_path()
+        unique = sorted(set(self.buffer))
+        with open(path, "wb") as f:
+            writer = BatchWriter(f)
+            writer.writelines(unique)
+            writer.flush()
+        self.dropped += len(self.buffer) - len(unique)
+        self.pending_runs.append(path)
+        self.buffer = []
+        self.buffer_used = 0
+
+    @staticmethod
+    def _read_run(path, tag):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield line.rstrip("\n"), tag
+
+    def drain(self):
+        """
+        Merge the spilled runs and yield, in sorted order, every candidate that
+        has not been emitted yet. Emitted candidates are kept on disk so that
+        later spills are still checked against them.
+        """
+        if not self.spilling:
+            return
+        self._flush_buffer()
+        if not self.pending_runs:
+            return
+
+        # emitted runs sort before pending ones for the same password (tag 0 < 1)
+        streams = [self._read_run(path, 0) for path in self.emitted_runs]
+        streams += [self._read_run(path, 1) for path in self.pending_runs]
+        emitted_path = self._new_run_path()
+        previous = None
+        with open(emitted_path, "wb") as f:
+            out = BatchWriter(f)
+            for password, tag in heapq.merge(*streams):
+                if password == previous:
+                    if tag:
+                        self.dropped += 1
+                    continue
+                previous = password
+                if tag:
+                    out.write(password)
+                    yield password
+            out.flush()
+
+        for path in self.pending_runs:
+            os.remove(path)
+        self.pending_runs = []
+        self.emitted_runs.append(emitted_path)
+
+    def close(self):
+        if self.spilling:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+
+class HashingStream:
+    """Binary stream wrapper keeping a SHA-256 of everything written through it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.hash.update(data)
+        self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def split_output_name(output_file):
+    """Split output/x.txt.gz into ("output/x", ".txt.gz")."""
+    base, ext = os.path.splitext(output_file)
+    if ext.lower() in COMPRESSORS:
+        base, inner = os.path.splitext(base)
+        ext = inner + ext
+    return base, ext
+
+
+def shard_path(output_file, index):
+    """output/x.txt -> output/x.000.txt"""
+    base, ext = split_output_name(output_file)
+    return f"{base}.{index:03d}{ext}"
+
+
+def manifest_path(output_file):
+    """output/x.txt -> output/x.manifest.json"""
+    return f"{split_output_name(output_file)[0]}.manifest.json"
+
+
+class ShardedWriter:
+    """
+    Line writer splitting the output into numbered shard files in a single pass:
+    round-robin over a fixed number of shards (--shards) or a new shard every
+    shard_lines lines (--shard-lines). close() writes a manifest with the line
+    count and SHA-256 (of the uncompressed lines) of every shard.
+    """
+
+    def __init__(self, output_file, shards=None, shard_lines=None):
+        self.output_file = output_file
+        self.shard_lines = shard_lines
+        self.stacks = []
+        self.paths = []
+        self.streams = []
+        self.writers = []
+        self.lines = []
+        self.position = 0
+        self.done = False
+        for _ in range(shards or 1):
+            self._open_shard()
+
+    def _open_shard(self):
+        path = shard_path(self.output_file, len(self.paths))
+        stack = contextlib.ExitStack()
+        stream = HashingStream(stack.enter_context(open_output(path)))
+        self.stacks.append(stack)
+        self.paths.append(path)
+        self.streams.append(stream)
+        self.writers.append(BatchWriter(stream))
+        self.lines.append(0)
+
+    def _current(self):
+        """Index of the shard receiving the next line in --shard-lines mode."""
+        if self.lines[-1] >= self.shard_lines:
+            # a full shard is finished: close it before starting the next one
+            self.writers[-1].flush()
+            self.stacks[-1].close()
+            self._open_shard()
+        return len(self.writers) - 1
+
+    def write(self, line):
+        if self.shard_lines:
+            index = self._current()
+        else:
+            index = self.position % len(self.writers)
+            self.position += 1
+        self.writers[index].write(line)
+        self.lines[index] += 1
+
+    def writelines(self, lines):
+        """Write every line of an iterable in bulk. Returns the number of lines."""
+        lines = iter(lines)
+        written = 0
+        while True:
+            chunk = list(itertools.islice(lines, BATCH_CHUNK_LINES))
+            if not chunk:
+                return written
+            written += len(chunk)
+            if self.shard_lines:
+                while chunk:
+                    index = self._current()
+                    part = chunk[:self.shard_lines - self.lines[index]]
+                    chunk = chunk[len(part):]
+                    self.lines[index] += self.writers[index].writelines(part)
+            else:
+                shards = len(self.writers)
+                for offset in range(shards):
+                    index = (self.position + offset) % shards
+                    self.lines[index] += self.writers[index].writelines(chunk[offset::shards])
+                self.position += len(chunk)
+
+    @property
+    def bytes(self):
+        """Bytes of every line accepted so far, over all the shards."""
+        return sum(writer.bytes for writer in self.writers)
+
+    def flush(self):
+        # in --shard-lines mode only the last shard is still open
+        for writer in self.writers[-1:] if self.shard_lines else self.writers:
+            writer.flush()
+
+    def close(self):
+        self.flush()
+        for stack in self.stacks:
+            stack.close()
+        manifest = {
+            "checksum": "sha256 of the uncompressed lines",
+            "total_lines": sum(self.lines),
+            "shards": [
+                {"file": os.path.basename(path), "lines": lines, "sha256": stream.hash.hexdigest()}
+                for path, lines, stream in zip(self.paths, self.lines, self.streams)
+            ],
+        }
+        with open(manifest_path(self.output_file), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+
+def sharded(args):
+    return bool(args.shards or args.shard_lines)
+
+
+@contextlib.contextmanager
+def open_writer(output_file, args, offset=None):
+    """
+    Return the line writer for a run: sharded when --shards/--shard-lines is set,
+    a HashChecker with --check-hashes.
+    """
+    if args.check_hashes:
+        with open_output(output_file, offset) as f:
+            checker = HashChecker(f, load_hashes(args.check_hashes))
+            try:
+                yield checker
+            finally:
+                checker.close()
+    elif sharded(args):
+        writer = ShardedWriter(output_file, args.shards, args.shard_lines)
+        try:
+            yield writer
+        finally:
+            writer.close()
+    else:
+        with open_output(output_file, offset) as f:
+            yield BatchWriter(f)
+
+
+def checkpoint_path(output_file):
+    """output/x.txt -> output/x.txt.checkpoint.json"""
+    return f"{output_file}.checkpoint.json"
+
+
+def resumable(output_file, args):
+    """True if the output offset is all a checkpoint needs to restart the run."""
+    return (
+        output_file not in (STDOUT, os.devnull)
+        and not sharded(args)
+        and not args.dedup
+        and not args.check_hashes
+        and args.limit is None
+        and args.time_limit is None
+        and os.path.splitext(output_file)[1].lower() not in COMPRESSORS
+    )
+
+
+class Checkpoint:
+    """
+    Periodic record of a resumable run, next to its output file.
+
+    It holds the target, the options, the stage index, the number of candidates
+    consumed from that stage (a cursor over its subset/symbol/number/year loops,
+    which run in a fixed order) and the output offset they ended at. --resume
+    cuts the output at the offset and replays the stage up to the cursor
+    without writing it, so nothing is missing or written twice.
+    """
+
+    def __init__(self, output_file, target, args):
+        self.path = checkpoint_path(output_file)
+        self.state = {
+            "output": output_file,
+            "target": target_record(target),
+            "options": {option: getattr(args, option) for option in CHECKPOINT_OPTIONS},
+            "settings": runtime_settings(),
+        }
+        self.saved = time.monotonic()
+
+    @property
+    def due(self):
+        return time.monotonic() - self.saved >= CHECKPOINT_INTERVAL
+
+    def save(self, stage, consumed, offset, count):
+        state = dict(self.state, stage=stage, consumed=consumed, offset=offset, count=count)
+        # write then rename, so an interruption never leaves half a checkpoint
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+        self.saved = time.monotonic()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class PasswordSink:
+    """
+    Single end point of the generation pipeline.
+    Every stage feeds its candidates here; the sink applies the length filter,
+    drops duplicates (with --dedup), counts what it keeps and hands it to a
+    line writer such as BatchWriter (file, stdout, ...).
+    """
+
+    def __init__(self, writer, dedup=None):
+        self.writer = writer
+        self.dedup = dedup
+        self.count = 0
+        self.kept = 0  # candidates accepted so far, including the ones --dedup defers
+        self.filtered = 0  # candidates dropped by the length window or --policy
+        self.limit = None  # stop accepting once kept reaches it, see GenerationBudget
+        self.policy = compiled_policy()
+
+    @property
+    def full(self):
+        return (self.limit is not None and self.kept >= self.limit) or self.writer.done
+
+    def write(self, password):
+        """
+        Write a single candidate. Returns True if it was kept, None if only
+        --policy dropped it (its leet variations may still meet the policy).
+        """
+        if self.full:
+            return False
+        if not length_fits(len(password)):
+            self.filtered += 1
+            return False
+        if self.policy and not self.policy(password):
+            self.filtered += 1
+            return None
+        status = self.dedup.add(password) if self.dedup else "new"
+        if status is None:
+            return False
+        self.kept += 1
+        if status == "new":
+            self._emit(password)
+        return True
+
+    @property
+    def copies_blocks(self):
+        """True if encoded lines can go to the writer as they are: no per-line work."""
+        return (self.dedup is None and self.policy is None and self.limit is None
+                and isinstance(self.writer, BatchWriter))
+
+    def write_block(self, f, lines, pulled):
+        """
+        Copy a file of lines already inside the length window to the writer.
+        pulled is the number of candidates they were kept from.
+        """
+        self.writer.write_file(f)
+        self.count += lines
+        self.kept += lines
+        self.filtered += pulled - lines
+
+    def _emit(self, password):
+        self.writer.write(password)
+        self.count += 1
+
+    def write_all(self, passwords):
+        if self.dedup:
+            for password in passwords:
+                if self.full:
+                    return
+                self.write(password)
+            return
+        if min_pwd_length <= 0 and max_pwd_length is None and not self.policy:
+            # every length fits: no filter between the stage and the writer
+            pulled = None
+            kept = passwords
+        else:
+            # counts the candidates pulled without a Python-level loop
+            pulled = itertools.count()
+            passwords = map(operator.itemgetter(0), zip(passwords, pulled))
+            if max_pwd_length is None:
+                kept = (password for password in passwords if len(password) >= min_pwd_length)
+            else:
+                kept = (password for password in passwords if min_pwd_length <= len(password) <= max_pwd_length)
+            if self.policy:
+                kept = filter(self.policy, kept)
+        if self.limit is not None:
+            kept = itertools.islice(kept, max(self.limit - self.kept, 0))
+        written = self.writer.writelines(kept)
+        self.count += written
+        self.kept += written
+        if pulled is not None:
+            self.filtered += next(pulled) - written
+
+    def flush(self):
+        """Write out deferred candidates and flush the underlying stream."""
+        if self.dedup:
+            for password in self.dedup.drain():
+                self._emit(password)
+        self.writer.flush()
+
+    def close(self):
+        self.flush()
+        if self.dedup:
+            self.dedup.close()
+
+
+class RunStats:
+    """
+    --stats: what every stage generated, filtered by length or --policy, lost to --dedup,
+    wrote (lines and bytes), how it used the transform cache and how long it
+    took. The sink, the writer and the cache already count all of it, so
+    stages are measured by differences at their boundaries. Buckets of
+    --ranked add up under their stage name.
+    """
+
+    FIELDS = ("generated", "filtered", "duplicates", "written", "bytes", "cache_hits", "cache_misses", "seconds")
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.started = None
+
+    def counters(self, sink):
+        return {
+            "filtered": sink.filtered,
+            "duplicates": sink.dedup.dropped if sink.dedup else 0,
+            "written": sink.kept,
+            "bytes": sink.writer.bytes,
+            "cache_hits": transform_cache.hits,
+            "cache_misses": transform_cache.misses,
+            "seconds": time.perf_counter(),
+        }
+
+    def start(self, sink):
+        self.started = self.counters(sink)
+
+    def stop(self, name, sink):
+        stage = self.stages.setdefault(name, dict.fromkeys(self.FIELDS, 0))
+        for field, value in self.counters(sink).items():
+            stage[field] += value - self.started[field]
+        stage["generated"] = stage["filtered"] + stage["duplicates"] + stage["written"]
+
+    def total(self):
+        return {field: sum(stage[field] for stage in self.stages.values()) for field in self.FIELDS}
+
+    def save(self, path, output_file, count):
+        total = self.total()
+        report = {
+            "output": output_file,
+            "passwords": count,
+            "total": dict(total, seconds=round(total["seconds"], 6)),
+            "stages": [dict(stage, stage=name, seconds=round(stage["seconds"], 6))
+                       for name, stage in self.stages.items()],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    def print_table(self):
+        print(f"\n{Colors.HEADER}Run statistics{Colors.RESET}")
+        print(f"{'Stage':<16}{'Generated':>14}{'Filtered':>12}{'Duplicates':>12}{'Written':>14}{'Size':>11}{'Time':>9}")
+        for name, stage in list(self.stages.items()) + [("Total", self.total())]:
+            if name == "Total":
+                print(f"{Colors.CYAN}{'─' * 88}{Colors.RESET}")
+            print(f"{name:<16}{stage['generated']:>14,}{stage['filtered']:>12,}{stage['duplicates']:>12,}"
+                  f"{stage['written']:>14,}{format_size(stage['bytes']):>11}{stage['seconds']:>8.2f}s")
+        total = self.total()
+        print(f"Transform cache: {total['cache_hits']:,} hits / {total['cache_misses']:,} misses")
+
+
+class StageProfiler:
+    """
+    --profile: cProfile and tracemalloc around every stage.
+
+    Each stage gets <output>.<stage>.prof, to open with pstats or snakeviz,
+    and <output>.profile.txt reports per stage its peak traced memory, the
+    lines that allocated most of what was still alive when it ended and the
+    functions with the most cumulative time. Buckets of --ranked add up under
+    their stage name. Work done by --workers processes is not profiled.
+    """
+
+    def __init__(self, output_file):
+        if output_file in (STDOUT, os.devnull):
+            create_output_folder()  # no output file created it
+            self.base = os.path.join(directory, "passforge")
+        else:
+            self.base = split_output_name(output_file)[0]
+        self.profiles = OrderedDict()
+        self.peaks = Counter()
+        self.allocations = {}
+        tracemalloc.start()
+
+    def start(self, name):
+        tracemalloc.clear_traces()
+        if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            tracemalloc.reset_peak()
+        self.profiles.setdefault(name, cProfile.Profile()).enable()
+
+    def stop(self, name):
+        self.profiles[name].disable()
+        self.peaks[name] = max(self.peaks[name], tracemalloc.get_traced_memory()[1])
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        allocations = self.allocations.setdefault(name, Counter())
+        for statistic in snapshot.statistics("lineno")[:PROFILE_TOP]:
+            frame = statistic.traceback[0]
+            source = linecache.getline(frame.filename, frame.lineno).strip()
+            allocations[f"{frame}  {source}"] += statistic.size
+
+    def close(self):
+        """Stop tracing and write the .prof files and the report. Returns the report path."""
+        tracemalloc.stop()
+        report = f"{self.base}.profile.txt"
+        with open(report, "w", encoding="utf-8") as f:
+            for name, profile in self.profiles.items():
+                profile.dump_stats(f"{self.base}.{name}.prof")
+                f.write(f"===== {name} =====\n")
+                f.write(f"Peak traced memory: {format_size(self.peaks[name])}\n\n")
+                f.write(f"Top {PROFILE_TOP} allocations still alive at the end of the stage:\n")
+                for line, size in self.allocations[name].most_common(PROFILE_TOP):
+                    f.write(f"{format_size(size):>12}  {line}\n")
+                functions = io.StringIO()
+                pstats.Stats(profile, stream=functions).sort_stats("cumulative").print_stats(PROFILE_TOP)
+                f.write(f"\nTop {PROFILE_TOP} functions by cumulative time:\n{functions.getvalue()}\n")
+        return report
+
+
+def until(passwords, deadline):
+    """Yield passwords until the time.monotonic() deadline passes."""
+    for index, password in enumerate(passwords):
+        if index % TIME_CHECK_INTERVAL == 0 and time.monotonic() >= deadline:
+            return
+        yield password
+
+
+class GenerationBudget:
+    """
+    --limit and --time-limit: candidates and seconds shared by the stages.
+
+    Protected stages are not given a share: they run until done or until
+    --limit itself is reached, never past it, and the lines of the protected
+    stages still to run are kept out of the cap. When a stage starts, what is left
+    of the budget is water-filled over it and the unprotected stages still to
+    run, using their --estimate sizes: a stage smaller than its STAGE_WEIGHTS
+    share gets all it needs and the rest is split again by priority, so no
+    budget is kept for stages that cannot use it. The time budget is turned
+    into candidates with the throughput measured so far. With --ranked the
+    buckets already come in priority order and simply spend the budget until
+    it runs out, only the protected stages are sized.
+    """
+
+    def __init__(self, limit=None, time_limit=None, sizes=None):
+        self.limit = limit
+        self.started = time.monotonic()
+        self.deadline = None if time_limit is None else self.started + time_limit
+        self.pending = dict(sizes or {})
+        self.finishing = None  # --time-limit: stages expected to finish within their share
+        self.cut = []
+
+    def quota(self, name, amount):
+        """Candidates stage name gets when amount candidates are left for the pending stages."""
+        stages = [other for other in self.pending if other not in PROTECTED_STAGES]
+        amount -= sum(size for other, size in self.pending.items() if other in PROTECTED_STAGES)
+        while amount > 0 and name in stages:
+            total = sum(STAGE_WEIGHTS[other] for other in stages)
+            small = [other for other in stages if self.pending[other] <= amount * STAGE_WEIGHTS[other] / total]
+            if not small:
+                return math.ceil(amount * STAGE_WEIGHTS[name] / total)
+            if name in small:
+                return self.pending[name]
+            for other in small:
+                amount -= self.pending[other]
+                stages.remove(other)
+        return max(int(amount), 0)
+
+    def start(self, name, sink):
+        """Set the sink limit for stage name and return its deadline (or None)."""
+        sink.limit = None
+        if name in PROTECTED_STAGES:
+            self.pending.pop(name, None)
+            if self.limit is not None:
+                # a hard cap even before the other stages, less what the
+                # protected stages still to run need
+                sink.limit = self.limit - sum(size for other, size in self.pending.items()
+                                              if other in PROTECTED_STAGES)
+            return None
+
+        if self.limit is not None:
+            left = max(self.limit - sink.kept, 0)
+            sink.limit = sink.kept + min(self.quota(name, left), left)
+
+        deadline = None
+        if self.deadline is not None:
+            now = time.monotonic()
+            seconds = max(self.deadline - now, 0)
+            rate = sink.kept / (now - self.started) if sink.kept and now > self.started else 0
+            if self.finishing is None and rate:
+                # planned once, with the throughput of the protected stages
+                self.finishing = {other for other in self.pending if other not in PROTECTED_STAGES
+                                  and self.quota(other, seconds * rate) >= self.pending[other]}
+            if not (self.finishing and name in self.finishing):
+                deadline = now + min(self.quota(name, seconds * rate) / rate, seconds) if rate else self.deadline
+        self.pending.pop(name, None)
+        return deadline
+
+    def stop(self, name, sink, passwords):
+        """Record whether stage name was cut short and release its generator."""
+        if next(passwords, None) is not None and name not in self.cut:
+            self.cut.append(name)
+        if hasattr(passwords, "close"):
+            passwords.close()
+        sink.limit = None
+
+
+def password_stages(attributes, target, years, numbers, skip=()):
+    """
+    Return the generation pipeline as an ordered list of
+    (name, progress message, generator) tuples, without the stages named in skip.
+    """
+    def subsets():
+        # every round walks its own lazy product
+        return create_permutations_with_repetition(attributes, words_in_passphrase_max)
+
+    if workers > 1:
+        second_round = parallel_round(permutations_second_round, subsets(), years, numbers, workers)
+        third_round = parallel_round(permutations_third_round, subsets(), years, numbers, workers)
+    else:
+        second_round = permutations_second_round(subsets(), years, numbers)
+        third_round = permutations_third_round(subsets(), years, numbers)
+
+    stages = [
+        ("trivial", f"\n{Colors.CYAN}[+]{Colors.RESET} Generating basic passwords...",
+         trivial_pwds(attributes, years, numbers)),
+        ("common", f"{Colors.CYAN}[+]{Colors.RESET} Adding common passwords...",
+         common_passwords(attributes, years, numbers)),
+        ("permutations_1", f"{Colors.CYAN}[+]{Colors.RESET} Generating word combinations...",
+         permutations_first_round(subsets(), years, numbers)),
+        ("permutations_2", None, second_round),
+        ("permutations_3", None, third_round),
+        ("advanced", f"{Colors.MAGENTA}[+]{Colors.RESET} Generating advanced patterns...",
+         advanced_patterns_passwords(attributes, target)),
+        ("ultra", f"{Colors.YELLOW}[+]{Colors.RESET} Generating ultra-advanced patterns (phonetic, mutations, ML)...",
+         ultra_advanced_passwords(attributes, target)),
+    ]
+    if passphrase_words > 2:
+        stages.insert(5, (
+            "passphrases", f"{Colors.CYAN}[+]{Colors.RESET} Generating passphrases of up to {passphrase_words} words...",
+            passphrases(attributes, years, numbers),
+        ))
+    return [stage for stage in stages if stage[0] not in skip]
+
+
+def attribute_weights(target):
+    """--ranked: weight of every attribute value, from the best field it appears in."""
+    weights = {}
+    for field, value in vars(target).items():
+        weight = ATTRIBUTE_WEIGHTS.get(field, DEFAULT_ATTRIBUTE_WEIGHT)
+        for elem in flush_None_values(value if isinstance(value, list) else [value]):
+            weights[elem] = max(weights.get(elem, 0), weight)
+    return weights
+
+
+def ranked_stages(attributes, target, years, numbers, skip=()):
+    """
+    Yield the pipeline of password_stages() as (name, progress message, generator)
+    buckets, most likely first, without the stages named in skip.
+    Trivial passwords are bucketed per attribute and the permutation rounds per
+    pair of words; a bucket scores its stage weight times the weight of its
+    words. The pair buckets come lazily from a merge of per-word sorted
+    streams, every round shares its suffix tables across its buckets and each
+    bucket streams its passwords, so neither the buckets nor the output are
+    held in memory.
+    """
+    weights = attribute_weights(target)
+    words = sorted(attributes, key=lambda word: (-weights[word], word))
+
+    # (score, stage name, stage function, arguments)
+    trivial = trivial_builder(years, numbers)
+    before = [(STAGE_WEIGHTS["common"], "common", common_passwords, (words, years, numbers))]
+    before += [(STAGE_WEIGHTS["trivial"] * weights[word], "trivial", trivial, (word,)) for word in words]
+    after = []
+    if passphrase_words > 2:
+        after.append((STAGE_WEIGHTS["passphrases"], "passphrases", passphrases, (words, years, numbers)))
+    after.append((STAGE_WEIGHTS["advanced"], "advanced", advanced_patterns_passwords, (words, target)))
+    after.append((STAGE_WEIGHTS["ultra"], "ultra", ultra_advanced_passwords, (words, target)))
+
+    def score(bucket):
+        return -bucket[0]
+
+    def pairs(name, build, word1):
+        # words are sorted by weight, so the pairs of word1 come out sorted
+        for word2 in words:
+            yield STAGE_WEIGHTS[name] * weights[word1] * weights[word2], name, build, ((word1, word2),)
+
+    streams = [sorted((bucket for bucket in before if bucket[1] not in skip), key=score)]
+    count = len(streams[0])
+    for name, builder in (
+        ("permutations_1", first_round_builder),
+        ("permutations_2", second_round_builder),
+        ("permutations_3", third_round_builder),
+    ):
+        if name not in skip:
+            build = builder(years, numbers)
+            streams.append(heapq.merge(*(pairs(name, build, word) for word in words), key=score))
+            count += len(words) ** 2
+    streams.append(sorted((bucket for bucket in after if bucket[1] not in skip), key=score))
+    count += len(streams[-1])
+
+    # merge() keeps equal scores in stream order, the order of password_stages()
+    message = f"\n{Colors.CYAN}[+]{Colors.RESET} Generating {count:,} pattern buckets, most likely first..."
+    for _, name, stage_function, stage_args in heapq.merge(*streams, key=score):
+        yield name, message, iter(stage_function(*stage_args))
+        message = None
+
+
+def chunked(iterable, size):
+    """Yield lists of up to size items of iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def copies_blocks(sink, passwords, args):
+    """True if a parallel round can be copied to the output without parsing it into lines."""
+    return (isinstance(passwords, ParallelRound) and passwords.lines is None
+            and not (args.leet or args.leetall) and sink.copies_blocks)
+
+
+def write_stage(sink, passwords, args):
+    """Feed candidates to the sink, with their leet variations when -l/-L is set."""
+    if copies_blocks(sink, passwords, args):
+        for _ in passwords.write_to(sink):
+            pass
+        return
+    if not (args.leet or args.leetall):
+        sink.write_all(passwords)
+        return
+    # leet runs inline on each kept candidate, so nothing is read back
+    for password in passwords:
+        if sink.full:
+            break
+        if sink.write(password) is not False:
+            sink.write_all(leet_variations(password, args.leetall))
+
+
+def generate_passwords(target, output_file, args, resume=None):
+    """
+    Run every stage for target and stream the result into output_file.
+    resume is the state of a Checkpoint to continue from.
+    Returns the number of passwords written.
+    """
+    if args.emit_rules:
+        return emit_rules(target, output_file, args)
+    if args.emit_masks:
+        return emit_masks(target, output_file, args)
+    global transform_cache
+    transform_cache = TransformCache()
+    attributes = attr_keywords_in_unique_list(target)
+    if passphrase_words > 2:
+        check_passphrase_keyspace(attributes, args.years, args.numbers)  # before the output is opened
+    dedup = Deduplicator(dedup_memory_mb * 1024 * 1024) if args.dedup else None
+    checkpoint = Checkpoint(output_file, target, args) if resumable(output_file, args) else None
+    if output_file != STDOUT and not resume and os.path.exists(checkpoint_path(output_file)):
+        os.remove(checkpoint_path(output_file))  # left by an older run of this file
+    first_stage, replayed = (resume["stage"], resume["consumed"]) if resume else (0, 0)
+    stats = RunStats()
+    profiler = StageProfiler(output_file) if args.profile else None
+
+    spill_warned = False
+    with open_writer(output_file, args, resume["offset"] if resume else None) as writer:
+        sink = PasswordSink(writer, dedup)
+        if resume:
+            sink.count = sink.kept = resume["count"]
+        try:
+            if args.leet or args.leetall:
+                print(f"{Colors.BLUE}[+]{Colors.RESET} Adding leet speak variations to every stage...")
+
+            skip = policy_skipped_stages(attributes, args.years, args.numbers, args.leet or args.leetall)
+            if skip:
+                print(f"{Colors.YELLOW}[!] No candidate of these stages can meet --policy, skipped:{Colors.RESET} "
+                      f"{', '.join(sorted(skip))}")
+            budgeted = args.limit is not None or args.time_limit is not None
+            sizes = None
+            if budgeted:
+                sizes = {name: estimate.lines + estimate.leet_lines
+                         for name, estimate in estimate_stages(attributes, target, args)
+                         if not args.ranked or name in PROTECTED_STAGES}
+            if args.ranked:
+                stages = ranked_stages(attributes, target, args.years, args.numbers, skip)
             else:
-                # Replace all leet chars
-                leet = elem
-                for char, replacement in leet_chars.items():
-                    leet = leet.replace(char, replacement)
-                f.write(f"{leet}\n")
+                stages = password_stages(attributes, target, args.years, args.numbers, skip)
+            budget = GenerationBudget(args.limit, args.time_limit, sizes)
+
+            for index, (name, message, passwords) in enumerate(stages):
+                if writer.done:
+                    break
+                if index < first_stage:
+                    continue
+                if message:
+                    print(message)
+                consumed = 0
+                if index == first_stage and replayed:
+                    # replay the stage up to the checkpoint cursor without writing it
+                    next(itertools.islice(passwords, replayed, replayed), None)
+                    consumed = replayed
+
+                stats.start(sink)
+                if profiler:
+                    profiler.start(name)
+                if budgeted:
+                    deadline = budget.start(name, sink)
+                    write_stage(sink, passwords if deadline is None else until(passwords, deadline), args)
+                    budget.stop(name, sink, passwords)
+                elif checkpoint and copies_blocks(sink, passwords, args):
+                    for pulled in passwords.write_to(sink):
+                        consumed += pulled
+                        if checkpoint.due:
+                            sink.flush()
+                            checkpoint.save(index, consumed, writer.stream.tell(), sink.count)
+                elif checkpoint:
+                    for chunk in chunked(passwords, CHECKPOINT_CHUNK):
+                        write_stage(sink, chunk, args)
+                        consumed += len(chunk)
+                        if checkpoint.due:
+                            sink.flush()
+                            checkpoint.save(index, consumed, writer.stream.tell(), sink.count)
+                else:
+                    write_stage(sink, passwords, args)
+                if profiler:
+                    profiler.stop(name)
+                stats.stop(name, sink)
+                if args.ranked and dedup and dedup.spilling and not spill_warned:
+                    print(f"{Colors.YELLOW}[!] --dedup memory is full, the candidates from here on are "
+                          f"written at the end in alphabetical order, not by rank; raise --dedup-memory "
+                          f"to keep the ranking{Colors.RESET}")
+                    spill_warned = True
+        finally:
+            sink.close()
+            if profiler:
+                profile_report = profiler.close()
+    if checkpoint:
+        checkpoint.remove()
+
+    if output_file == STDOUT:
+        destination = "stdout"
+    elif sharded(args):
+        destination = manifest_path(output_file)
+    else:
+        destination = output_file
+    if args.check_hashes:
+        print(f"\n{Colors.SUCCESS}✓ Cracked:{Colors.RESET} {Colors.BOLD}{len(writer.cracked)} of {writer.total}{Colors.RESET} "
+              f"hashes, written to {Colors.UNDERLINE}{destination}{Colors.RESET}")
+        print(f"{Colors.SUCCESS}✓ Candidates checked:{Colors.RESET} {Colors.BOLD}{sink.count:,}{Colors.RESET}")
+    else:
+        print(f"\n{Colors.SUCCESS}✓ Password list generated:{Colors.RESET} {Colors.UNDERLINE}{destination}{Colors.RESET}")
+        print(f"{Colors.SUCCESS}✓ Total passwords:{Colors.RESET} {Colors.BOLD}{sink.count:,}{Colors.RESET}")
+    if budget.cut:
+        print(f"{Colors.YELLOW}[!] Budget reached, stages cut short:{Colors.RESET} {', '.join(budget.cut)}")
+    if dedup:
+        print(f"{Colors.SUCCESS}✓ Duplicates removed:{Colors.RESET} {Colors.BOLD}{dedup.dropped:,}{Colors.RESET}")
+    if profiler:
+        print(f"{Colors.SUCCESS}✓ Profile:{Colors.RESET} {profile_report} and {profiler.base}.<stage>.prof")
+    if args.stats:
+        stats.save(args.stats, output_file, sink.count)
+        stats.print_table()
+        print(f"{Colors.SUCCESS}✓ Statistics written:{Colors.RESET} {args.stats}")
+    return sink.count
+
+
+# ----- Keyspace estimation -----
+
+
+# The leet keys as bytes, deleted with bytes.translate() to count them in C
+# (UTF-8 never puts an ASCII byte inside a multi-byte character)
+_LEET_KEY_BYTES = "".join(leet_chars).encode()
+
+
+def _shapes(strings):
+    """
+    Summarise strings as a Counter of shapes.
+    A shape is (length, encoded size, has leet key, leet-able chars): everything
+    the sink and the leet transform look at, so candidates can be counted by
+    shape instead of being built.
+    """
+    shapes = Counter()
+    without_keys = itertools.repeat(None), itertools.repeat(_LEET_KEY_BYTES)
+    for chunk in chunked(strings, ESTIMATE_CHUNK):
+        # has a case-sensitive leet key, number of leet-able chars once lowered:
+        # over the whole chunk, with the loops in C
+        encoded = list(map(str.encode, chunk))
+        sizes = list(map(len, encoded))
+        lowered = list(map(str.encode, map(str.lower, chunk)))
+        has_keys = map(operator.ne, map(len, map(bytes.translate, encoded, *without_keys)), sizes)
+        leetable = map(operator.sub, map(len, lowered), map(len, map(bytes.translate, lowered, *without_keys)))
+        shapes.update(zip(map(len, chunk), sizes, has_keys, leetable))
+    return shapes
+
+
+def _number_shapes(start, end):
+    """Shapes of every integer in [start, end], counted per digit length in closed form."""
+    shapes = Counter()
+    for low, high, sign in ((max(start, 0), end, 0), (start, min(end, -1), 1)):
+        if low > high:
+            continue
+        if sign:
+            low, high = -high, -low
+        digits = 1
+        while 10 ** (digits - 1) <= max(high, 1):
+            first = 0 if digits == 1 else 10 ** (digits - 1)
+            last = 10 ** digits - 1
+            count = min(high, last) - max(low, first) + 1
+            if count > 0:
+                length = digits + sign
+                shapes[(length, length, False, 0)] += count
+            digits += 1
+    return shapes
+
+
+def _concat(*parts):
+    """Shapes of every concatenation of one string from each part."""
+    result = Counter({(0, 0, False, 0): 1})
+    for part in parts:
+        combined = Counter()
+        for (length, size, key, leet), count in result.items():
+            for (p_length, p_size, p_key, p_leet), p_count in part.items():
+                combined[(length + p_length, size + p_size, key or p_key, leet + p_leet)] += count * p_count
+        result = combined
+    return result
+
+
+def _heads(words):
+    """
+    Group words by length and by the shapes of their case variations, i.e. by
+    everything that matters when they start a candidate (word1 + suffix).
+    Returns [(length, variation shapes, number of words)].
+    """
+    heads = Counter()
+    for word in words:
+        heads[(len(word), tuple(sorted(_shapes(case_variations(word)).items())))] += 1
+    return [(length, Counter(dict(variants)), count) for (length, variants), count in heads.items()]
+
+
+def _leet_lines(has_key, leetable, leetall):
+    """Number of leet lines leet_variations() yields for one password."""
+    if not has_key:
+        return 0
+    if not leetall:
+        return 1
+    max_k = leetable if leet_max_substitutions is None else min(leetable, leet_max_substitutions)
+    total, binomial = 0, 1
+    for k in range(max_k + 1):
+        total += binomial
+        binomial = binomial * (leetable - k) // (k + 1)
+    return total if leet_word_budget is None else min(total, leet_word_budget + 1)
+
+
+class KeyspaceEstimate:
+    """Line and byte counters of one stage, leet lines kept apart."""
+
+    def __init__(self, leet, leetall):
+        self.leet = leet
+        self.leetall = leetall
+        self.lines = 0
+        self.bytes = 0
+        self.leet_lines = 0
+        self.leet_bytes = 0
+
+    def add(self, shapes, times=1):
+        """Account for shapes as if they were written to the sink `times` times."""
+        for (length, size, has_key, leetable), count in shapes.items():
+            if not length_fits(length):
+                continue
+            count *= times
+            self.lines += count
+            self.bytes += count * (size + 1)
+            if self.leet:
+                leets = count * _leet_lines(has_key, leetable, self.leetall)
+                self.leet_lines += leets
+                self.leet_bytes += leets * (size + 1)
+
+
+def estimate_stages(attributes, target, args):
+    """
+    Return [(stage name, KeyspaceEstimate)] for the pipeline of password_stages().
+
+    The combinatorial stages (trivial and the permutation rounds) are counted in
+    closed form from per-word shapes, grouped by head word. The advanced and ultra stages are linear in
+    the number of attributes, so their few candidates per word are measured in bulk.
+    """
+    leet = args.leet or args.leetall
+    estimates = []
+
+    def stage(name):
+        estimate = KeyspaceEstimate(leet, args.leetall)
+        estimates.append((name, estimate))
+        return estimate
+
+    unique_words = list(dict.fromkeys(attributes))
+    symbol_shapes = _shapes(symbols)
+    number_shapes = _number_shapes(starting_number, ending_number)
+    year_shapes = _number_shapes(starting_year, ending_year)
+    first_number_shapes = _number_shapes(starting_number, starting_number)
+
+    # the generators only prune what the length window drops, so no gates here
+    # trivial
+    estimate = stage("trivial")
+    estimate.add(_shapes(attributes))
+    for length, variants, count in _heads(attributes):
+        estimate.add(_concat(variants, symbol_shapes), count)
+        if args.numbers:
+            estimate.add(_concat(variants, symbol_shapes, number_shapes), count)
+        if args.years:
+            estimate.add(_concat(variants, symbol_shapes, year_shapes), count)
+
+    stage("common").add(_shapes(common_pwds))
+
+    first, second, third = stage("permutations_1"), stage("permutations_2"), stage("permutations_3")
+    tails = _shapes(unique_words)
+    for length, variants, count in _heads(unique_words):
+        for tail, tail_count in tails.items():
+            pair = _concat(variants, Counter({tail: 1}))
+            pairs = count * tail_count
+
+            first.add(pair, pairs)
+            if args.numbers:
+                first.add(_concat(pair, number_shapes), pairs)
+            if args.years:
+                first.add(_concat(pair, year_shapes), pairs)
+
+            with_symbol = _concat(pair, symbol_shapes)
+            second.add(with_symbol, pairs)
+            if args.numbers:
+                second.add(_concat(with_symbol, number_shapes), 2 * pairs)
+            if args.years:
+                second.add(_concat(with_symbol, year_shapes), 2 * pairs)
+
+            with_symbols = _concat(with_symbol, symbol_shapes)
+            if args.numbers:
+                third.add(_concat(with_symbols, first_number_shapes), pairs)
+            if args.years:
+                third.add(_concat(with_symbols, year_shapes), pairs)
+
+    if passphrase_words > 2:
+        estimate = stage("passphrases")
+        word_shapes = _shapes(unique_words)
+        tail_shapes = _shapes(passphrase_tails(args.years, args.numbers))
+        for separator in passphrase_separators:
+            gap = _concat(_shapes([separator]), word_shapes)
+            phrase = word_shapes
+            for k in range(2, passphrase_words + 1):
+                phrase = _concat(phrase, gap)
+                if k > 2:
+                    estimate.add(_concat(phrase, tail_shapes))
+        total = passphrase_count(unique_words, args.years, args.numbers)
+        if total > passphrase_limit:
+            # --sample: the sample has the shapes of the whole stage, scaled down
+            for field in ("lines", "bytes", "leet_lines", "leet_bytes"):
+                setattr(estimate, field, round(getattr(estimate, field) * passphrase_limit / total))
+
+    # measured with a throwaway TransformCache, not to warm the run's own
+    global transform_cache
+    run_cache, transform_cache = transform_cache, TransformCache()
+    try:
+        for name, passwords in (
+            ("advanced", advanced_patterns_passwords(attributes, target)),
+            ("ultra", ultra_advanced_passwords(attributes, target)),
+        ):
+            stage(name).add(_shapes(passwords))
+    finally:
+        transform_cache = run_cache
+
+    skip = policy_skipped_stages(attributes, args.years, args.numbers, leet)
+    return [(name, estimate) for name, estimate in estimates if name not in skip]
+
+
+def format_size(size):
+    """Human readable byte size."""
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def print_estimate(target, args):
+    """Print the per-stage keyspace of target without generating anything."""
+    attributes = attr_keywords_in_unique_list(target)
+    estimates = estimate_stages(attributes, target, args)
+
+    print(f"\n{Colors.HEADER}Keyspace estimate{Colors.RESET}")
+    print(f"{'Stage':<16}{'Lines':>18}{'Size':>14}")
+    total_lines = total_bytes = leet_lines = leet_bytes = 0
+    for name, estimate in estimates:
+        print(f"{name:<16}{estimate.lines:>18,}{format_size(estimate.bytes):>14}")
+        total_lines += estimate.lines
+        total_bytes += estimate.bytes
+        leet_lines += estimate.leet_lines
+        leet_bytes += estimate.leet_bytes
+    if args.leet or args.leetall:
+        print(f"{'leet':<16}{leet_lines:>18,}{format_size(leet_bytes):>14}")
+        total_lines += leet_lines
+        total_bytes += leet_bytes
+    print(f"{Colors.CYAN}{'─' * 48}{Colors.RESET}")
+    print(f"{Colors.BOLD}{'Total':<16}{total_lines:>18,}{format_size(total_bytes):>14}{Colors.RESET}")
+    if args.dedup:
+        print(f"{Colors.YELLOW}[!] Counts are before --dedup removes duplicates.{Colors.RESET}")
+    if password_policy:
+        print(f"{Colors.YELLOW}[!] Counts are before --policy drops candidates without the required "
+              f"characters.{Colors.RESET}")
+    if passphrase_words > 2 and passphrase_count(attributes, args.years, args.numbers) > passphrase_limit:
+        if passphrase_sample:
+            print(f"{Colors.YELLOW}[!] Passphrases are sampled down to --max-passphrases "
+                  f"{passphrase_limit:,}.{Colors.RESET}")
+        else:
+            print(f"{Colors.ERROR}✗ Passphrases are over --max-passphrases {passphrase_limit:,}: "
+                  f"generation would refuse to run without --sample.{Colors.RESET}")
+
+
+# ----- Rule export -----
+
+
+def rule_append(text):
+    """Rule functions appending text: 123 -> $1 $2 $3"""
+    return " ".join(f"${char}" for char in text)
+
+
+def rule_prepend(text):
+    """Rule functions prepending text: my -> ^y ^m"""
+    return " ".join(f"^{char}" for char in reversed(text))
+
+
+def rule(*functions):
+    """One rule line of hashcat/John syntax; ":" keeps the word as it is."""
+    return " ".join(function for function in functions if function) or ":"
+
+
+def password_rules(years, numbers, leet):
+    """
+    Return the rules that rebuild, from a base word, the passwords of
+    trivial_pwds(), add_reverse_words(), add_common_patterns(),
+    add_special_multipliers(), advanced_capitalization() and
+    advanced_substitutions(), plus their -l leet version. Rules run on every
+    base word, so words the generators skip (too short, no letters) give
+    extra candidates rather than missing ones.
+    """
+    tails = [""] + number_suffixes(numbers) + year_suffixes(years)
+    rules = [rule()]
+
+    # trivial: word, case variation + symbol [+ number | year]
+    for case in ("l", "u", "c"):
+        for symbol in symbols:
+            rules.extend(rule(case, rule_append(symbol + tail)) for tail in tails)
+
+    # reverse words, common suffixes/prefixes and special multipliers
+    rules.append(rule("r"))
+    for case in ("", "c"):
+        rules.extend(rule(case, rule_append(suffix)) for suffix in COMMON_SUFFIXES)
+        rules.extend(rule(case, rule_prepend(prefix)) for prefix in COMMON_PREFIXES)
+    rules.extend(rule(rule_append(multiplier)) for multiplier in SPECIAL_MULTIPLIERS)
+
+    # capitalization: the half lower/half upper pattern depends on the length
+    # of the word, no rule can express it
+    rules.extend(["l", "u", "c", "l r T0 r T0"])
+
+    # substitutions, single and a->@ e->3 o->0 together
+    substitutions = [f"s{char}{replacement}" for char, replacements in ADVANCED_SUBSTITUTIONS.items()
+                     for replacement in replacements]
+    substitutions.append("sa@ se3 so0")
+    for substitution in substitutions:
+        rules.append(rule("l", substitution))
+        rules.append(rule("l", substitution, "c"))
+
+    rules = list(dict.fromkeys(rules))
+    if leet:
+        # -l replaces every leet char of the whole candidate
+        leet_rule = " ".join(f"s{char}{replacement}" for char, replacement in leet_chars.items())
+        rules += [rule(function, leet_rule) for function in rules if function != ":"] + [leet_rule]
+    return rules
+
+
+def rules_path(output_file):
+    """output/x.txt -> output/x.rule"""
+    return f"{split_output_name(output_file)[0]}.rule"
+
+
+def static_path(output_file):
+    """output/x.txt -> output/x.static.txt"""
+    base, ext = split_output_name(output_file)
+    return f"{base}.static{ext}"
+
+
+def static_passwords(target, leet):
+    """
+    The passwords of the pipeline that are no transform of a single attribute:
+    common passwords, dates, months/seasons and keyboard patterns, with their
+    -l leet version, inside the length window and without duplicates.
+    """
+    passwords = itertools.chain(common_pwds, date_passwords(target), temporal_passwords(target), KEYBOARD_PATTERNS)
+    passwords = [password for password in dict.fromkeys(passwords) if length_fits(len(password))]
+    if leet:
+        passwords += [variation for password in passwords for variation in leet_variations(password, False)]
+    return list(dict.fromkeys(passwords))
+
+
+def emit_rules(target, output_file, args):
+    """
+    --emit-rules: write the base words of target to output_file, the rules
+    that expand them to rules_path(output_file), for the cracker to apply,
+    and the fixed patterns no rule can build to static_path(output_file).
+    Returns the number of base words and static passwords written.
+    """
+    global transform_cache
+    transform_cache = TransformCache()
+    words = attr_keywords_in_unique_list(target)
+    rules = password_rules(args.years, args.numbers, args.leet)
+    static = static_passwords(target, args.leet)
+    for path, lines in ((output_file, words), (static_path(output_file), static)):
+        with open_output(path) as f:
+            writer = BatchWriter(f)
+            writer.writelines(lines)
+            writer.flush()
+    with open(rules_path(output_file), "w", encoding="utf-8", newline="\n") as f:
+        f.write("".join(f"{line}\n" for line in rules))
+
+    print(f"\n{Colors.SUCCESS}✓ Base words:{Colors.RESET} {Colors.UNDERLINE}{output_file}{Colors.RESET} "
+          f"({len(words):,} words)")
+    print(f"{Colors.SUCCESS}✓ Rules:{Colors.RESET} {Colors.UNDERLINE}{rules_path(output_file)}{Colors.RESET} "
+          f"({len(rules):,} rules)")
+    print(f"{Colors.SUCCESS}✓ Static passwords:{Colors.RESET} {Colors.UNDERLINE}{static_path(output_file)}"
+          f"{Colors.RESET} ({len(static):,} common, date, month/season and keyboard passwords)")
+    print(f"{Colors.INFO}   hashcat -a 0 <hashes> {output_file} -r {rules_path(output_file)}{Colors.RESET}")
+    print(f"{Colors.INFO}   hashcat -a 0 <hashes> {static_path(output_file)}{Colors.RESET}")
+    print(f"{Colors.YELLOW}[!] Not exported: word combinations (permutation rounds, passphrases), the "
+          f"half lower/half upper capitalization and the ultra-advanced patterns (phonetic, mutations, "
+          f"ML); generate them without --emit-rules.{Colors.RESET}")
+    return len(words) + len(static)
+
+
+# ----- Mask export -----
+
+
+def digit_blocks(low, high):
+    """
+    Split [low, high] (non-negative, same number of digits) into blocks of
+    consecutive integers sharing a prefix, one digit range and free trailing
+    digits: 1985-1999 -> (1985, 5 digits, 0 free), (1990, 1 digit, 1 free).
+    """
+    digits = len(str(low))
+    blocks = []
+    while low <= high:
+        free = 0
+        while free + 1 < digits and low % 10 ** (free + 1) == 0 and low + 10 ** (free + 1) - 1 <= high:
+            free += 1
+        step = 10 ** free
+        count = 1
+        while (low // step) % 10 + count <= 9 and low + (count + 1) * step - 1 <= high:
+            count += 1
+        blocks.append((low, count, free))
+        low += count * step
+    return blocks
+
+
+def range_masks(start, end):
+    """
+    hashcat .hcmask lines ([charset,]mask) matching exactly the integers of
+    [start, end], e.g. 1985-1999 -> ["56789,198?1", "199?d"].
+    """
+    masks = []
+    for low, high, sign in ((max(-end, 1), -start, "-"), (max(start, 0), end, "")):
+        digits = len(str(low))
+        while low <= high:
+            # numbers of one digit count at a time, so no mask has a leading zero
+            last = min(high, 10 ** digits - 1)
+            for first, count, free in digit_blocks(low, last):
+                text = str(first)
+                prefix, digit = text[:len(text) - free - 1], int(text[len(text) - free - 1])
+                if count == 10:
+                    charset, position = None, "?d"
+                elif count == 1:
+                    charset, position = None, str(digit)
+                else:
+                    charset, position = "".join(str(d) for d in range(digit, digit + count)), "?1"
+                mask = sign + prefix + position + "?d" * free
+                masks.append(f"{charset},{mask}" if charset else mask)
+            low, digits = last + 1, digits + 1
+    return masks
+
+
+def length_ranges(start, end):
+    """
+    Split [start, end] into (printed length, low, high) ranges,
+    e.g. -5..20 -> (2, -5, -1), (1, 0, 9), (2, 10, 20).
+    """
+    ranges = []
+    for digits in range(1, len(str(max(abs(start), abs(end)))) + 1):
+        first, last = (0 if digits == 1 else 10 ** (digits - 1)), 10 ** digits - 1
+        low, high = max(-last, start), min(-max(first, 1), end)
+        if low <= high:
+            ranges.append((digits + 1, low, high))
+        low, high = max(first, start), min(last, end)
+        if low <= high:
+            ranges.append((digits, low, high))
+    return ranges
+
+
+def tail_masks(number_range, years, numbers):
+    """
+    The .hcmask lines of the -n numbers in number_range and of the -y years,
+    by printed length: {length: [mask, ...]}.
+    """
+    ranges = [number_range] if numbers else []
+    if years:
+        ranges.append((starting_year, ending_year))
+    masks = {}
+    for start, end in ranges:
+        for length, low, high in length_ranges(start, end):
+            masks.setdefault(length, []).extend(range_masks(low, high))
+    return masks
+
+
+def hybrid_bases(attributes):
+    """
+    Yield (base, number range) for what the stages put in front of a number
+    or a year, with the -n range the stage appends to it:
+    - word + symbol (trivial)
+    - word1 + word2 (first round)
+    - word1 + symbol + word2, word1 + word2 + symbol (second round)
+    - word1 + symbol + word2 + symbol2 (third round, starting number only)
+    - the passphrases, with --words
+    with word and word1 in every case variation.
+    """
+    numbers = (starting_number, ending_number)
+    for elem in attributes:
+        for base in combine(case_variants(elem), symbols):
+            yield base, numbers
+
+    third = (starting_number, starting_number)
+    for word1, word2 in create_permutations_with_repetition(attributes, words_in_passphrase_max):
+        suffixes = [word2]
+        for symbol in symbols:
+            suffixes += [symbol + word2, word2 + symbol]
+        for base in combine(case_variants(word1), suffixes):
+            yield base, numbers
+        for base in combine(case_variants(word1), [symbol + word2 + symbol2 for symbol in symbols for symbol2 in symbols]):
+            yield base, third
+
+    if passphrase_words > 2:
+        for base in passphrases(attributes, False, False):
+            yield base, numbers
+
+
+def hybrid_path(output_file, group=1):
+    """output/x.txt -> output/x.hybrid.txt, output/x.hybrid-2.txt for group 2"""
+    base, ext = split_output_name(output_file)
+    return f"{base}.hybrid{ext}" if group == 1 else f"{base}.hybrid-{group}{ext}"
+
+
+def mask_path(output_file, group=1):
+    """output/x.txt -> output/x.hcmask, output/x-2.hcmask for group 2"""
+    base = split_output_name(output_file)[0]
+    return f"{base}.hcmask" if group == 1 else f"{base}-{group}.hcmask"
+
+
+def emit_masks(target, output_file, args):
+    """
+    --emit-masks: instead of expanding the -y/-n ranges, write
+    - hybrid_path(output_file): every base that takes a number or a year,
+    - mask_path(output_file): masks matching those numbers and years,
+    for a hybrid (wordlist + mask) attack, then the passwords that take none
+    into output_file. hashcat runs every mask on every base, so bases taking
+    other masks (the third round only takes the starting number, -m/-M only
+    lets some tail lengths fit) go to their own group, hybrid_path(output_file, 2)
+    and mask_path(output_file, 2), ... Returns the number of lines of all lists.
+    """
+    attributes = attr_keywords_in_unique_list(target)
+    if passphrase_words > 2:
+        # the keyspace the masks expand to, checked before any file is opened
+        check_passphrase_keyspace(attributes, args.years, args.numbers)
+    leet = args.leet or args.leetall
+    by_length = {}
+    base_masks = {}
+
+    def masks_of(base, number_range):
+        # the masks of the tails that keep base + tail inside the length window
+        key = (len(base), number_range)
+        if key not in base_masks:
+            if number_range not in by_length:
+                by_length[number_range] = tail_masks(number_range, args.years, args.numbers)
+            base_masks[key] = tuple(dict.fromkeys(
+                mask for length, masks in sorted(by_length[number_range].items())
+                if length_fits(len(base) + length) for mask in masks))
+        return base_masks[key]
+
+    groups = OrderedDict()  # masks -> [writer, lines]
+    with contextlib.ExitStack() as stack:
+        for base, number_range in hybrid_bases(attributes):
+            masks = masks_of(base, number_range)
+            if not masks:
+                continue
+            if masks not in groups:
+                path = hybrid_path(output_file, len(groups) + 1)
+                groups[masks] = [BatchWriter(stack.enter_context(open_output(path))), 0]
+            group = groups[masks]
+            group[0].write(base)
+            group[1] += 1
+            if leet:
+                # leet never touches the digits, so it runs on the base alone
+                for variation in leet_variations(base, args.leetall):
+                    group[0].write(variation)
+                    group[1] += 1
+        for writer, _ in groups.values():
+            writer.flush()
+    for index, masks in enumerate(groups, 1):
+        with open(mask_path(output_file, index), "w", encoding="utf-8", newline="\n") as f:
+            f.write("".join(f"{mask}\n" for mask in masks))
+
+    straight = argparse.Namespace(**vars(args))
+    straight.emit_masks = straight.years = straight.numbers = False
+    count = generate_passwords(target, output_file, straight)
+
+    hybrid_count = 0
+    print(f"{Colors.INFO}   hashcat -a 0 <hashes> {output_file}{Colors.RESET}")
+    for index, (masks, (_, lines)) in enumerate(groups.items(), 1):
+        print(f"{Colors.SUCCESS}✓ Hybrid bases:{Colors.RESET} {Colors.UNDERLINE}{hybrid_path(output_file, index)}"
+              f"{Colors.RESET} ({lines:,} lines, {len(masks):,} masks)")
+        print(f"{Colors.INFO}   hashcat -a 6 <hashes> {hybrid_path(output_file, index)} "
+              f"{mask_path(output_file, index)}{Colors.RESET}")
+        hybrid_count += lines
+    return count + hybrid_count
+
+
+# ----- Hash checking -----
+
+
+def load_hashes(path):
+    """
+    Read the --check-hashes file: one unsalted MD5, SHA1 or SHA256 hex digest
+    per line, told apart by their length. Returns {digest: algorithm}.
+    """
+    hashes = {}
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            digest = line.strip().lower()
+            if not digest or digest.startswith("#"):
+                continue
+            algorithm = HASH_ALGORITHMS.get(len(digest))
+            if algorithm is None or not all(char in "0123456789abcdef" for char in digest):
+                raise ValueError(f"line {number}: not an MD5, SHA1 or SHA256 hex digest")
+            hashes[digest] = algorithm
+    if not hashes:
+        raise ValueError("no hashes found")
+    return hashes
+
+
+hash_targets = {}  # worker side of --check-hashes: {algorithm: set of digests}
+
+
+def _init_hash_worker(targets):
+    """Pool initializer: the digests are sent once, not with every batch."""
+    global hash_targets
+    hash_targets = targets
+
+
+def _hash_batch(passwords, targets=None):
+    """Worker: return the (digest, password) pairs of passwords matching a target."""
+    encoded = [password.encode("utf-8") for password in passwords]
+    matches = []
+    for algorithm, digests in (targets or hash_targets).items():
+        new = getattr(hashlib, algorithm)
+        for data in encoded:
+            digest = new(data).hexdigest()
+            if digest in digests:
+                matches.append((digest, data.decode("utf-8")))
+    return matches
+
+
+class HashChecker:
+    """
+    Line writer hashing the candidates instead of storing them (--check-hashes).
+
+    Candidates are sent in batches of HASH_BATCH_LINES to a process pool, with
+    a few batches in flight. Every match is printed and written to the stream
+    as digest:password as soon as its batch comes back; once every hash is
+    cracked, done ends the run.
+    """
+
+    def __init__(self, stream, hashes, processes=None):
+        self.stream = stream
+        self.remaining = dict(hashes)
+        self.total = len(hashes)
+        self.cracked = {}
+        self.done = False
+        self.encoded = 0
+        self.lines = []
+        self.pending = deque()
+        if processes is None:
+            # a --targets worker cannot start a pool of its own
+            daemon = multiprocessing.current_process().daemon
+            processes = 1 if daemon else workers if workers > 1 else os.cpu_count() or 1
+        self.max_pending = 2 * processes
+        self.targets = {}
+        for digest, algorithm in hashes.items():
+            self.targets.setdefault(algorithm, set()).add(digest)
+        self.pool = multiprocessing.Pool(processes, _init_hash_worker, (self.targets,)) if processes > 1 else None
+
+    @property
+    def bytes(self):
+        """Bytes of the digest:password lines written so far."""
+        return self.encoded
+
+    def write(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= HASH_BATCH_LINES:
+            lines, self.lines = self.lines, []
+            self._submit(lines)
+
+    def writelines(self, lines):
+        """Hash every line of an iterable, until done. Returns the number of lines."""
+        lines = iter(lines)
+        written = 0
+        while not self.done:
+            chunk = list(itertools.islice(lines, HASH_BATCH_LINES))
+            if not chunk:
+                break
+            written += len(chunk)
+            self._submit(chunk)
+        return written
+
+    def _submit(self, passwords):
+        if self.done:
+            return
+        if self.pool is None:
+            self._collect(_hash_batch(passwords, self.targets))
+            return
+        self.pending.append(self.pool.apply_async(_hash_batch, (passwords,)))
+        # collect what is back; wait for the oldest batch when too many are in flight
+        while self.pending and (self.pending[0].ready() or len(self.pending) > self.max_pending):
+            self._collect(self.pending.popleft().get())
+
+    def _collect(self, matches):
+        for digest, password in matches:
+            if digest not in self.remaining:
+                continue
+            algorithm = self.remaining.pop(digest)
+            self.cracked[digest] = password
+            print(f"{Colors.SUCCESS}✓ Cracked {algorithm}:{Colors.RESET} {digest} {Colors.BOLD}{password}{Colors.RESET}")
+            data = f"{digest}:{password}\n".encode("utf-8")
+            self.stream.write(data)
+            self.stream.flush()
+            self.encoded += len(data)
+        if not self.remaining and not self.done:
+            self.done = True
+            print(f"{Colors.SUCCESS}✓ Every hash cracked, stopping early{Colors.RESET}")
+
+    def flush(self):
+        """Hash the batched candidates and wait for every batch in flight."""
+        if self.lines:
+            lines, self.lines = self.lines, []
+            self._submit(lines)
+        while self.pending:
+            self._collect(self.pending.popleft().get())
+        self.stream.flush()
+
+    def close(self):
+        if self.pool:
+            # batches still in flight once done are not needed
+            self.pool.terminate()
+            self.pool.join()
 
 
 # ----- Person -----
@@ -1014,53 +3476,20 @@ class Person:
         self.person_keywords = person_keywords
 
 
-def person(add_leet, years, leetall, numbers):
+def person(args):
     print(f"{Colors.INFO}🎯 Targeting a person...{Colors.RESET}\n")
     target = input_person()
-    default_output = False
+    if args.estimate:
+        print_estimate(target, args)
+        return
 
     # output filename
     if target.name and target.name != "":
-        create_output_file(target.name + "-" + target.surname + ".txt")
-
-    else:
-        create_output_file("passforge-output.txt")
-        default_output = True
-
-    if default_output:
-        output_file = os.path.join("output", "passforge-output.txt")
+        output_file = create_output_file(target.name + "-" + target.surname + ".txt", args.output, sharded(args))
     else:
-        output_file = os.path.join("output", target.name + "-" + target.surname + ".txt")
-
-    # real computation here
-
-    attributes = attr_keywords_in_unique_list(target)
+        output_file = create_output_file("passforge-output.txt", args.output, sharded(args))
 
-    print(f"\n{Colors.CYAN}[+]{Colors.RESET} Generating basic passwords...")
-    trivial_pwds(attributes, years, numbers, output_file)
-
-    print(f"{Colors.CYAN}[+]{Colors.RESET} Adding common passwords...")
-    common_passwords(attributes, years, numbers, output_file)
-
-    print(f"{Colors.CYAN}[+]{Colors.RESET} Generating word combinations...")
-    subsets = permutations_first_round(attributes, years, numbers, output_file)
-
-    permutations_second_round(subsets, years, numbers, output_file)
-
-    permutations_third_round(subsets, years, numbers, output_file)
-
-    print(f"{Colors.MAGENTA}[+]{Colors.RESET} Generating advanced patterns...")
-    advanced_patterns_passwords(attributes, target, output_file)
-
-    print(f"{Colors.YELLOW}[+]{Colors.RESET} Generating ultra-advanced patterns (phonetic, mutations, ML)...")
-    ultra_advanced_passwords(attributes, target, output_file)
-
-    if add_leet or leetall:
-        print(f"{Colors.BLUE}[+]{Colors.RESET} Adding leet speak variations...")
-        leet_pwds(leetall, output_file)
-    
-    print(f"\n{Colors.SUCCESS}✓ Password list generated:{Colors.RESET} {Colors.UNDERLINE}{output_file}{Colors.RESET}")
-    print(f"{Colors.SUCCESS}✓ Total passwords:{Colors.RESET} {Colors.BOLD}{sum(1 for _ in open(output_file)):,}{Colors.RESET}")
+    generate_passwords(target, output_file, args)
 
 
 def input_person():
@@ -1109,52 +3538,20 @@ class Company:
         self.company_keywords = company_keywords
 
 
-def company(add_leet, years, leetall, numbers):
+def company(args):
     print(f"{Colors.INFO}🏢 Targeting a company...{Colors.RESET}\n")
     target = input_company()
-    default_output = False
+    if args.estimate:
+        print_estimate(target, args)
+        return
 
     # output filename
     if target.name and target.name != "":
-        create_output_file(target.name + ".txt")
-    else:
-        create_output_file("passforge-output.txt")
-        default_output = True
-
-    if default_output:
-        output_file = os.path.join("output", "passforge-output.txt")
+        output_file = create_output_file(target.name + ".txt", args.output, sharded(args))
     else:
-        output_file = os.path.join("output", target.name + ".txt")
-
-    # real computation here
-
-    attributes = attr_keywords_in_unique_list(target)
-
-    print(f"\n{Colors.CYAN}[+]{Colors.RESET} Generating basic passwords...")
-    trivial_pwds(attributes, years, numbers, output_file)
+        output_file = create_output_file("passforge-output.txt", args.output, sharded(args))
 
-    print(f"{Colors.CYAN}[+]{Colors.RESET} Adding common passwords...")
-    common_passwords(attributes, years, numbers, output_file)
-
-    print(f"{Colors.CYAN}[+]{Colors.RESET} Generating word combinations...")
-    subsets = permutations_first_round(attributes, years, numbers, output_file)
-
-    permutations_second_round(subsets, years, numbers, output_file)
-
-    permutations_third_round(subsets, years, numbers, output_file)
-
-    print(f"{Colors.MAGENTA}[+]{Colors.RESET} Generating advanced patterns...")
-    advanced_patterns_passwords(attributes, target, output_file)
-
-    print(f"{Colors.YELLOW}[+]{Colors.RESET} Generating ultra-advanced patterns (phonetic, mutations, ML)...")
-    ultra_advanced_passwords(attributes, target, output_file)
-
-    if add_leet or leetall:
-        print(f"{Colors.BLUE}[+]{Colors.RESET} Adding leet speak variations...")
-        leet_pwds(leetall, output_file)
-    
-    print(f"\n{Colors.SUCCESS}✓ Password list generated:{Colors.RESET} {Colors.UNDERLINE}{output_file}{Colors.RESET}")
-    print(f"{Colors.SUCCESS}✓ Total passwords:{Colors.RESET} {Colors.BOLD}{sum(1 for _ in open(output_file)):,}{Colors.RESET}")
+    generate_passwords(target, output_file, args)
 
 
 def input_company():
@@ -1173,16 +3570,249 @@ def input_company():
     return target
 
 
+# ----- Batch mode -----
+
+
+def load_targets(path):
+    """
+    Read the --targets file and return a list of records (dicts).
+    .csv files need a header row, .json files hold a list of objects and any
+    other file is read as JSON lines. A record that cannot be parsed is kept
+    as the exception, so that only that target fails.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            records = json.load(f)
+            return records if isinstance(records, list) else [records]
+
+        records = []
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as error:
+                records.append(ValueError(f"line {number}: {error}"))
+        return records
+
+
+def target_from_record(record):
+    """
+    Build a Person or Company from a --targets record.
+    The optional "type" field picks the class, otherwise company-only fields
+    select Company. "keywords" is accepted for both kinds, as a list or as a
+    comma separated string.
+    """
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object, got {type(record).__name__}")
+
+    # blank values are ignored, so CSV columns can be shared by both kinds
+    fields = {str(key).strip(): value for key, value in record.items() if key and value not in (None, "")}
+    kind = str(fields.pop("type", "") or "").strip().lower()
+    if not kind:
+        kind = "company" if {"web_domain", "company_keywords"} & set(fields) else "person"
+    if kind not in ("person", "company"):
+        raise ValueError(f"unknown target type '{kind}'")
+
+    cls = Person if kind == "person" else Company
+    keywords_field = f"{kind}_keywords"
+    if "keywords" in fields:
+        fields[keywords_field] = fields.pop("keywords")
+
+    allowed = set(vars(cls()))
+    unknown = sorted(set(fields) - allowed)
+    if unknown:
+        raise ValueError(f"unknown {kind} field(s): {', '.join(unknown)}")
+
+    target = cls()
+    for key, value in fields.items():
+        if key == keywords_field:
+            value = prepare_keywords(",".join(map(str, value)) if isinstance(value, list) else str(value))
+        else:
+            value = str(value).strip()
+        setattr(target, key, value)
+    return target
+
+
+def target_record(target):
+    """Inverse of target_from_record(), used to save the target of a checkpoint."""
+    kind = "company" if isinstance(target, Company) else "person"
+    return dict(vars(target), type=kind)
+
+
+def target_output_name(target, index):
+    """File name used for target number index of a batch."""
+    if isinstance(target, Company) and target.name:
+        return target.name + ".txt"
+    if isinstance(target, Person) and target.name:
+        return target.name + "-" + (target.surname or "") + ".txt"
+    return f"passforge-output-{index:03d}.txt"
+
+
+def unique_output_names(targets):
+    """
+    Output file names of a batch, {index: name} for every target that is not
+    None. A name already taken (case-insensitively, as on some file systems)
+    gets the index of its record, so no two workers write the same file.
+    """
+    names = {}
+    taken = set()
+    for index, target in enumerate(targets):
+        if target is None:
+            continue
+        name = target_output_name(target, index)
+        if name.lower() in taken:
+            base, ext = os.path.splitext(name)
+            name = f"{base}-{index:03d}{ext}"
+        taken.add(name.lower())
+        names[index] = name
+    return names
+
+
+def _generate_target(task):
+    """Worker: generate the list of one batch target, never raising."""
+    index, record, name, args, settings = task
+    try:
+        apply_runtime_settings(settings)
+        target = target_from_record(record)
+        create_output_folder()
+        output_file = os.path.join(directory, name)
+        if args.stats:
+            args = argparse.Namespace(**dict(vars(args), stats=os.path.splitext(output_file)[0] + ".stats.json"))
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            count = generate_passwords(target, output_file, args)
+        return index, output_file, count, None
+    except Exception as error:
+        return index, None, 0, f"{type(error).__name__}: {error}"
+
+
+def batch(args):
+    """Generate one list per record of args.targets, concurrently."""
+    try:
+        records = load_targets(args.targets)
+    except (OSError, ValueError) as error:
+        print(f"{Colors.ERROR}✗ Cannot read {args.targets}: {error}{Colors.RESET}")
+        sys.exit(1)
+
+    print(f"{Colors.INFO}📋 Targeting {len(records)} records from {args.targets}...{Colors.RESET}\n")
+
+    if args.estimate:
+        for index, record in enumerate(records):
+            try:
+                target = target_from_record(record)
+            except ValueError as error:
+                print(f"{Colors.ERROR}✗ Target #{index}: {error}{Colors.RESET}")
+                continue
+            print(f"\n{Colors.CYAN}[+]{Colors.RESET} Target #{index}: {target_output_name(target, index)}")
+            print_estimate(target, args)
+        return
+
+    # records are parsed here first, so output names can be made unique
+    failed = 0
+    targets = []
+    for index, record in enumerate(records):
+        try:
+            targets.append(target_from_record(record))
+        except ValueError as error:
+            failed += 1
+            targets.append(None)
+            print(f"{Colors.ERROR}✗ Target #{index}: {error}{Colors.RESET}")
+    names = unique_output_names(targets)
+
+    # every target is one task; the permutation rounds stay sequential inside it
+    settings = dict(runtime_settings(), workers=1)
+    tasks = [(index, records[index], name, args, settings) for index, name in names.items()]
+    processes = min(workers if workers > 1 else (os.cpu_count() or 1), max(len(tasks), 1))
+
+    with multiprocessing.Pool(processes) as pool:
+        for index, output_file, count, error in pool.imap_unordered(_generate_target, tasks):
+            if error:
+                failed += 1
+                print(f"{Colors.ERROR}✗ Target #{index}: {error}{Colors.RESET}")
+            else:
+                print(f"{Colors.SUCCESS}✓ Target #{index}:{Colors.RESET} {output_file} ({count:,} passwords)")
+
+    print(f"\n{Colors.SUCCESS}✓ {len(records) - failed} of {len(records)} targets generated{Colors.RESET}")
+    if failed:
+        sys.exit(1)
+
+
+# ----- Resume -----
+
+
+def resume_run(args):
+    """Continue the run that wrote args.resume from its last checkpoint."""
+    output_file = args.resume
+    try:
+        with open(checkpoint_path(output_file), encoding="utf-8") as f:
+            state = json.load(f)
+        target = target_from_record(state["target"])
+    except (OSError, ValueError, KeyError) as error:
+        print(f"{Colors.ERROR}✗ Cannot resume {output_file}: {error}{Colors.RESET}")
+        sys.exit(1)
+    if not os.path.exists(output_file) or os.path.getsize(output_file) < state["offset"]:
+        print(f"{Colors.ERROR}✗ Cannot resume {output_file}: it is shorter than its checkpoint{Colors.RESET}")
+        sys.exit(1)
+
+    for option, value in state["options"].items():
+        setattr(args, option, value)
+    apply_runtime_settings(state["settings"])
+
+    print(f"{Colors.INFO}⏯  Resuming {output_file} at {state['count']:,} passwords...{Colors.RESET}")
+    generate_passwords(target, output_file, args, state)
+
+
 # ----- Main function -----
 
 
 def main():
 
-    banner()
-
     parser = get_parser()
     args = parser.parse_args()
 
+    for option, value in (("--shards", args.shards), ("--shard-lines", args.shard_lines)):
+        if value is not None and value <= 0:
+            print(f"{option} requires an integer greater than 0.")
+            sys.exit(1)
+    if args.targets and (args.person or args.company or args.output):
+        print("--targets cannot be combined with -p, -c or -o.")
+        sys.exit(1)
+    if args.resume and (args.person or args.company or args.targets or args.output):
+        print("--resume cannot be combined with -p, -c, --targets or -o.")
+        sys.exit(1)
+    if args.check_hashes:
+        if args.emit_rules or args.emit_masks or sharded(args):
+            print("--check-hashes cannot be combined with --emit-rules, --emit-masks, --shards or --shard-lines.")
+            sys.exit(1)
+        try:
+            load_hashes(args.check_hashes)
+        except (OSError, ValueError) as error:
+            print(f"Cannot read {args.check_hashes}: {error}")
+            sys.exit(1)
+    if args.emit_rules and (args.leetall or args.output == STDOUT or sharded(args) or args.stats):
+        print("--emit-rules cannot be combined with -L, -o -, --shards, --shard-lines or --stats.")
+        sys.exit(1)
+    if args.emit_masks and (args.emit_rules or not (args.years or args.numbers)
+                            or args.output == STDOUT or sharded(args)):
+        print("--emit-masks requires -y or -n and cannot be combined with --emit-rules, -o -, "
+              "--shards or --shard-lines.")
+        sys.exit(1)
+    if args.output == STDOUT and sharded(args):
+        print("-o - cannot be combined with --shards or --shard-lines.")
+        sys.exit(1)
+
+    if args.output == STDOUT:
+        # stdout carries the passwords: banner, progress and prompts go to stderr
+        sys.stdout = sys.stderr
+
+    banner()
+
     if args.version:
         version()
     if args.minlength:
@@ -1195,12 +3825,100 @@ def main():
         if min_pwd_length <= 0:
             print("-m requires an integer greater than 0.")
             sys.exit(1)
-    if args.company:
-        company(args.leet, args.years, args.leetall, args.numbers)
-    elif args.person:
-        person(args.leet, args.years, args.leetall, args.numbers)
-    else:
-        parser.print_help()
+    if args.maxlength is not None:
+        global max_pwd_length
+        if args.maxlength < max(min_pwd_length, 1):
+            print("-M requires an integer greater than 0 and not smaller than -m.")
+            sys.exit(1)
+        max_pwd_length = args.maxlength
+    if args.words is not None:
+        global passphrase_words
+        if not 2 <= args.words <= PASSPHRASE_MAX_WORDS:
+            print(f"--words requires an integer between 2 and {PASSPHRASE_MAX_WORDS}.")
+            sys.exit(1)
+        passphrase_words = args.words
+    if args.separators:
+        global passphrase_separators
+        passphrase_separators = list(dict.fromkeys([""] + list(args.separators)))
+    if args.max_passphrases is not None:
+        global passphrase_limit
+        if args.max_passphrases <= 0:
+            print("--max-passphrases requires an integer greater than 0.")
+            sys.exit(1)
+        passphrase_limit = args.max_passphrases
+    if args.sample:
+        global passphrase_sample
+        passphrase_sample = True
+    if args.policy:
+        global password_policy
+        try:
+            policy = PasswordPolicy(args.policy)
+        except ValueError as error:
+            print(f"--policy: {error}.")
+            sys.exit(1)
+        # the lengths join the -m/-M window, which prunes inside the stages
+        min_pwd_length = max(min_pwd_length, policy.min_length)
+        if policy.max_length is not None:
+            max_pwd_length = min(max_pwd_length or policy.max_length, policy.max_length)
+        if max_pwd_length is not None and max_pwd_length < min_pwd_length:
+            print("--policy lengths do not overlap -m/-M.")
+            sys.exit(1)
+        password_policy = args.policy
+    if args.limit is not None and args.limit <= 0:
+        print("--limit requires an integer greater than 0.")
+        sys.exit(1)
+    if args.time_limit is not None and args.time_limit <= 0:
+        print("--time-limit requires a number of seconds greater than 0.")
+        sys.exit(1)
+    if args.leet_max_subs is not None:
+        global leet_max_substitutions
+        if args.leet_max_subs <= 0:
+            print("--leet-max-subs requires an integer greater than 0.")
+            sys.exit(1)
+        leet_max_substitutions = args.leet_max_subs
+    if args.leet_budget is not None:
+        global leet_word_budget
+        if args.leet_budget <= 0:
+            print("--leet-budget requires an integer greater than 0.")
+            sys.exit(1)
+        leet_word_budget = args.leet_budget
+    if args.workers is not None:
+        global workers
+        if args.workers <= 0:
+            print("--workers requires an integer greater than 0.")
+            sys.exit(1)
+        workers = args.workers
+    if args.buffer_size is not None:
+        global buffer_size_kb
+        if args.buffer_size <= 0:
+            print("--buffer-size requires an integer greater than 0.")
+            sys.exit(1)
+        buffer_size_kb = args.buffer_size
+    if args.dedup_memory is not None:
+        global dedup_memory_mb
+        if args.dedup_memory <= 0:
+            print("--dedup-memory requires an integer greater than 0.")
+            sys.exit(1)
+        dedup_memory_mb = args.dedup_memory
+    try:
+        if args.resume:
+            resume_run(args)
+        elif args.targets:
+            batch(args)
+        elif args.company:
+            company(args)
+        elif args.person:
+            person(args)
+        else:
+            parser.print_help()
+    except KeyspaceTooLarge as error:
+        print(f"{Colors.ERROR}✗ {error}{Colors.RESET}")
+        sys.exit(1)
+    except BrokenPipeError:
+        # the reader of -o - went away (e.g. | head): stop quietly
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.__stdout__.fileno())
+        sys.exit(1)
 
 
 if __name__ == "__main__":
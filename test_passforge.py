@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Tests for the PassForge generation pipeline
+"""
+
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import pstats
+import re
+
+import pytest
+
+import passforge
+
+
+def make_person():
+    """Small person profile shared by the tests"""
+    return passforge.Person(
+        name="Alice",
+        surname="Johnson",
+        birth_day="15",
+        birth_month="03",
+        birth_year="1990",
+        person_keywords=["travel"],
+    )
+
+
+def test_stages_are_generators():
+    """Every stage yields candidates instead of writing a file"""
+    target = make_person()
+    attributes = passforge.attr_keywords_in_unique_list(target)
+    for name, _, passwords in passforge.password_stages(attributes, target, True, True):
+        first = next(iter(passwords), None)
+        assert first is None or isinstance(first, str), name
+
+
+def test_sink_filters_and_counts():
+    """The sink drops short candidates and counts what it writes"""
+    stream = io.BytesIO()
+    sink = passforge.PasswordSink(passforge.BatchWriter(stream))
+    old_min = passforge.min_pwd_length
+    passforge.min_pwd_length = 4
+    try:
+        sink.write_all(["abc", "abcd", "alice1"])
+        sink.close()
+    finally:
+        passforge.min_pwd_length = old_min
+    assert sink.count == 2
+    assert stream.getvalue() == b"abcd\nalice1\n"
+
+
+def test_dedup_spills_to_disk():
+    """Duplicates are removed both in memory and after spilling to disk"""
+    stream = io.BytesIO()
+    dedup = passforge.Deduplicator(memory_limit=2048)
+    sink = passforge.PasswordSink(passforge.BatchWriter(stream), dedup)
+    words = [f"word{i % 50}" for i in range(500)]
+    sink.write_all(words)
+    sink.close()
+    assert dedup.spill_dir is None
+    assert sorted(stream.getvalue().decode().split()) == sorted(set(words))
+    assert sink.count == 50
+    assert dedup.dropped == 450
+
+
+def test_leet_combinations_fewest_substitutions_first():
+    """--leetall variations are lazy, ordered and capped by --leet-max-subs"""
+    assert list(passforge.leet_combinations("tea")) == [
+        "tea", "7ea", "t3a", "te4", "73a", "7e4", "t34", "734",
+    ]
+    assert list(passforge.leet_combinations("tea", 1)) == ["tea", "7ea", "t3a", "te4"]
+
+
+def test_leet_budget_counts_substituted_variations(monkeypatch):
+    """--leet-budget N keeps the lowercased password plus N substituted variations"""
+    monkeypatch.setattr(passforge, "leet_word_budget", 1)
+    assert list(passforge.leet_variations("Alice!1", True)) == ["alice!1", "4lice!1"]
+    assert passforge._leet_lines(True, 3, True) == 2
+
+
+def test_estimate_matches_generation(tmp_path):
+    """--estimate counts exactly the lines and bytes a run writes"""
+    target = make_person()
+    args = passforge.get_parser().parse_args(["-p", "-y", "-n", "-l"])
+    attributes = passforge.attr_keywords_in_unique_list(target)
+    cache = passforge.transform_cache
+    counters = (cache.hits, cache.misses)
+    estimates = passforge.estimate_stages(attributes, target, args)
+    assert passforge.transform_cache is cache and (cache.hits, cache.misses) == counters
+
+    output_file = str(tmp_path / "out.txt")
+    passforge.generate_passwords(target, output_file, args)
+    with open(output_file, "rb") as f:
+        data = f.read()
+    assert sum(e.lines + e.leet_lines for _, e in estimates) == data.count(b"\n")
+    assert sum(e.bytes + e.leet_bytes for _, e in estimates) == len(data)
+
+
+def test_parallel_round_matches_sequential():
+    """--workers shards a round by first word without changing its output"""
+    attributes = passforge.attr_keywords_in_unique_list(make_person())
+    sequential = list(passforge.permutations_second_round(
+        passforge.create_permutations_with_repetition(attributes, 2), True, False))
+    parallel = list(passforge.parallel_round(
+        passforge.permutations_second_round, passforge.create_permutations_with_repetition(attributes, 2),
+        True, False, 2))
+    assert parallel == sequential
+
+
+def test_compressed_output(tmp_path):
+    """Output paths ending in .gz are compressed by the background writer"""
+    output_file = str(tmp_path / "out.txt.gz")
+    with passforge.open_output(output_file) as f:
+        sink = passforge.PasswordSink(passforge.BatchWriter(f, buffer_size=16))
+        sink.write_all(f"password{i}" for i in range(1000))
+        sink.close()
+    with gzip.open(output_file, "rt") as f:
+        assert f.read().split() == [f"password{i}" for i in range(1000)]
+
+
+def test_sharded_output_manifest(tmp_path):
+    """--shard-lines splits the output in one pass and records every shard"""
+    output_file = str(tmp_path / "out.txt")
+    writer = passforge.ShardedWriter(output_file, shard_lines=4)
+    sink = passforge.PasswordSink(writer)
+    sink.write_all(f"password{i}" for i in range(10))
+    sink.close()
+    writer.close()
+
+    with open(passforge.manifest_path(output_file)) as f:
+        manifest = json.load(f)
+    assert [shard["lines"] for shard in manifest["shards"]] == [4, 4, 2]
+    for shard in manifest["shards"]:
+        with open(str(tmp_path / shard["file"]), "rb") as f:
+            assert hashlib.sha256(f.read()).hexdigest() == shard["sha256"]
+
+
+def test_target_from_record():
+    """--targets records become Person or Company objects"""
+    person = passforge.target_from_record({"name": "Alice", "birth_year": 1990, "keywords": "a, b", "email": ""})
+    assert isinstance(person, passforge.Person)
+    assert person.birth_year == "1990"
+    assert person.person_keywords == ["a", "b"]
+
+    company = passforge.target_from_record({"web_domain": "acme.com", "keywords": ["cloud"]})
+    assert isinstance(company, passforge.Company)
+    assert company.company_keywords == ["cloud"]
+
+
+def test_batch_gives_duplicate_names_their_own_file(tmp_path, monkeypatch):
+    """Records with the same name never share an output file; a bad record fails alone"""
+    record = {"name": "Alice", "surname": "Johnson", "birth_year": "1990"}
+    targets_file = tmp_path / "targets.jsonl"
+    targets_file.write_text("\n".join(json.dumps(r) for r in [record, {"unknown_field": 1}, record]) + "\n")
+    monkeypatch.setattr(passforge, "directory", str(tmp_path / "output"))
+    args = passforge.get_parser().parse_args(["--targets", str(targets_file), "-n"])
+    with pytest.raises(SystemExit):
+        passforge.batch(args)
+
+    expected = passforge.generate_passwords(passforge.target_from_record(record), str(tmp_path / "one.txt"), args)
+    for name in ("Alice-Johnson.txt", "Alice-Johnson-002.txt"):
+        with open(str(tmp_path / "output" / name), "rb") as f:
+            assert f.read().count(b"\n") == expected
+    assert sorted(p.name for p in (tmp_path / "output").iterdir()) == ["Alice-Johnson-002.txt", "Alice-Johnson.txt"]
+
+
+def test_transform_cache_counts_and_evicts():
+    """Transforms run once per (transform, word, length window, birth_year) and old entries are evicted"""
+    cache = passforge.TransformCache(max_entries=2)
+    assert cache.get(passforge.word_mutations, "alice") == cache.get(passforge.word_mutations, "alice")
+    cache.get(passforge.ml_pattern_analysis, "alice", "1990")
+    cache.get(passforge.ml_pattern_analysis, "alice", "1991")
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert ("word_mutations", "alice", passforge.min_pwd_length, passforge.max_pwd_length) not in cache.entries
+    assert len(cache.entries) == 2
+
+    old = passforge.max_pwd_length
+    passforge.max_pwd_length = 6
+    try:
+        assert "alice1990" not in cache.get(passforge.ml_pattern_analysis, "alice", "1991")
+    finally:
+        passforge.max_pwd_length = old
+    assert cache.misses == 4
+
+
+def test_length_window_is_pruned_exactly(tmp_path):
+    """-m/-M prune inside the stages without losing any candidate of the window"""
+    target = make_person()
+    args = passforge.get_parser().parse_args(["-p", "-y", "-n"])
+    old = passforge.min_pwd_length, passforge.max_pwd_length
+    try:
+        passforge.min_pwd_length, passforge.max_pwd_length = 8, None
+        passforge.generate_passwords(target, str(tmp_path / "all.txt"), args)
+        passforge.max_pwd_length = 10
+        passforge.generate_passwords(target, str(tmp_path / "window.txt"), args)
+    finally:
+        passforge.min_pwd_length, passforge.max_pwd_length = old
+    with open(str(tmp_path / "all.txt")) as f:
+        expected = sorted(line for line in f.read().split() if len(line) <= 10)
+    with open(str(tmp_path / "window.txt")) as f:
+        assert sorted(f.read().split()) == expected
+
+
+def test_ranked_reorders_without_changing_the_list(tmp_path):
+    """--ranked writes the same passwords, likely patterns before third-round ones"""
+    target = make_person()
+    parser = passforge.get_parser()
+    for flags, name in ((["-p", "-y", "-n"], "plain.txt"), (["-p", "-y", "-n", "--ranked"], "ranked.txt")):
+        passforge.generate_passwords(target, str(tmp_path / name), parser.parse_args(flags))
+    with open(str(tmp_path / "plain.txt")) as f:
+        plain = f.read().split()
+    with open(str(tmp_path / "ranked.txt")) as f:
+        ranked = f.read().split()
+    assert sorted(ranked) == sorted(plain)
+    assert ranked[0] == "Alice"
+    assert ranked.index("Alice!1") < ranked.index("alice?Johnson%1990")
+
+
+def test_ranked_warns_when_dedup_spills(tmp_path, capsys):
+    """--ranked --dedup warns once the dedup memory is full and the ranking is lost"""
+    args = passforge.get_parser().parse_args(["-p", "-y", "-n", "--ranked", "--dedup"])
+    old = passforge.dedup_memory_mb
+    passforge.dedup_memory_mb = 1
+    try:
+        passforge.generate_passwords(make_person(), str(tmp_path / "out.txt"), args)
+    finally:
+        passforge.dedup_memory_mb = old
+    assert capsys.readouterr().out.count("not by rank") == 1
+
+
+def test_limit_keeps_protected_stages_and_cuts_the_rest(tmp_path):
+    """--limit lets trivial and common finish and cuts the other stages at the budget"""
+    target = make_person()
+    args = passforge.get_parser().parse_args(["-p", "-y", "-n", "--limit", "20000"])
+    output_file = str(tmp_path / "out.txt")
+    count = passforge.generate_passwords(target, output_file, args)
+    with open(output_file) as f:
+        written = f.read().split()
+    assert count == len(written) == 20000
+
+    attributes = passforge.attr_keywords_in_unique_list(target)
+    protected = list(passforge.trivial_pwds(attributes, True, True)) + passforge.common_pwds
+    assert written[:len(protected)] == protected
+
+    # a limit below the protected stages still holds, common keeps its lines
+    trivial = protected[:-len(passforge.common_pwds)]
+    args = passforge.get_parser().parse_args(["-p", "-y", "-n", "--limit", "1000"])
+    assert passforge.generate_passwords(target, output_file, args) == 1000
+    with open(output_file) as f:
+        assert f.read().split() == trivial[:1000 - len(passforge.common_pwds)] + passforge.common_pwds
+    args = passforge.get_parser().parse_args(["-p", "-y", "-n", "--limit", "5"])
+    assert passforge.generate_passwords(target, output_file, args) == 5
+    with open(output_file) as f:
+        assert f.read().split() == passforge.common_pwds[:5]
+
+
+def test_resume_continues_without_duplicates_or_gaps(tmp_path, monkeypatch):
+    """--resume cuts the output at the checkpoint and replays the stage cursor"""
+    target = make_person()
+    args = passforge.get_parser().parse_args(["-p", "-y", "-n", "-l"])
+    full_file = str(tmp_path / "full.txt")
+    passforge.generate_passwords(target, full_file, args)
+
+    output_file = str(tmp_path / "out.txt")
+    write_stage = passforge.write_stage
+    calls = []
+
+    def interrupted(sink, passwords, args):
+        calls.append(None)
+        if len(calls) == 30:
+            write_stage(sink, passwords[:100], args)
+            sink.flush()
+            raise KeyboardInterrupt
+        write_stage(sink, passwords, args)
+
+    monkeypatch.setattr(passforge, "CHECKPOINT_INTERVAL", 0)
+    monkeypatch.setattr(passforge, "write_stage", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        passforge.generate_passwords(target, output_file, args)
+    monkeypatch.setattr(passforge, "write_stage", write_stage)
+
+    with open(passforge.checkpoint_path(output_file)) as f:
+        state = json.load(f)
+    assert state["stage"] > 0 and state["consumed"] > 0
+    resumed = passforge.target_from_record(state["target"])
+    passforge.generate_passwords(resumed, output_file, args, state)
+
+    with open(full_file, "rb") as f, open(output_file, "rb") as g:
+        assert f.read() == g.read()
+    assert not (tmp_path / "out.txt.checkpoint.json").exists()
+
+
+def test_stats_match_the_written_list(tmp_path):
+    """--stats counts lines, bytes, filtered and duplicate candidates per stage"""
+    target = make_person()
+    stats_file = str(tmp_path / "stats.json")
+    output_file = str(tmp_path / "out.txt")
+    args = passforge.get_parser().parse_args(["-p", "-n", "--dedup", "--stats", stats_file])
+    old_min = passforge.min_pwd_length
+    passforge.min_pwd_length = 6
+    try:
+        count = passforge.generate_passwords(target, output_file, args)
+    finally:
+        passforge.min_pwd_length = old_min
+
+    with open(stats_file) as f:
+        stats = json.load(f)
+    with open(output_file, "rb") as f:
+        data = f.read()
+    assert stats["passwords"] == count == data.count(b"\n")
+    assert stats["total"]["bytes"] == len(data)
+    assert stats["total"]["filtered"] > 0 and stats["total"]["duplicates"] > 0
+    assert stats["total"]["cache_misses"] > 0
+    assert [stage["stage"] for stage in stats["stages"]][:2] == ["trivial", "common"]
+    for stage in stats["stages"]:
+        assert stage["generated"] == stage["filtered"] + stage["duplicates"] + stage["written"]
+
+
+def test_profile_writes_one_prof_per_stage(tmp_path):
+    """--profile leaves a loadable .prof per stage and an allocation report"""
+    output_file = str(tmp_path / "out.txt")
+    args = passforge.get_parser().parse_args(["-p", "--profile"])
+    passforge.generate_passwords(make_person(), output_file, args)
+
+    for name in ("trivial", "permutations_3", "ultra"):
+        assert pstats.Stats(str(tmp_path / f"out.{name}.prof")).total_calls > 0
+    with open(str(tmp_path / "out.profile.txt")) as f:
+        report = f.read()
+    assert "===== advanced =====" in report and "Peak traced memory" in report
+
+
+def test_profile_of_stdout_goes_to_the_output_folder(tmp_path, monkeypatch, capsys):
+    """--profile -o - creates the output folder for passforge.<stage>.prof"""
+    monkeypatch.setattr(passforge, "directory", str(tmp_path / "output"))
+    args = passforge.get_parser().parse_args(["-p", "--profile"])
+    passforge.generate_passwords(make_person(), passforge.STDOUT, args)
+    capsys.readouterr()
+    assert pstats.Stats(str(tmp_path / "output" / "passforge.trivial.prof")).total_calls > 0
+    assert (tmp_path / "output" / "passforge.profile.txt").exists()
+
+
+def test_passphrases_are_lazy_and_guarded(tmp_path, monkeypatch):
+    """--words adds 3-4 word passphrases, refused or sampled over --max-passphrases"""
+    target = make_person()
+    attributes = passforge.attr_keywords_in_unique_list(target)
+    monkeypatch.setattr(passforge, "passphrase_words", 4)
+    monkeypatch.setattr(passforge, "passphrase_separators", ["", "-"])
+    full = list(passforge.passphrases(attributes, True, False))
+    assert len(full) == passforge.passphrase_count(attributes, True, False)
+    assert full[:2] == ["AliceAliceAlice", "AliceAliceAlice1985"]
+    assert "Alice-Johnson-travel-travel1990" in full
+    assert passforge.get_parser().parse_args(["--words", "4", "--separators=-_."]).separators == "-_."
+
+    args = passforge.get_parser().parse_args(["-p", "-y"])
+    output_file = str(tmp_path / "out.txt")
+    monkeypatch.setattr(passforge, "passphrase_limit", 1000)
+    with pytest.raises(passforge.KeyspaceTooLarge):
+        passforge.generate_passwords(target, output_file, args)
+    assert not (tmp_path / "out.txt").exists()
+
+    monkeypatch.setattr(passforge, "passphrase_sample", True)
+    sample = list(passforge.passphrases(attributes, True, False))
+    assert len(sample) == 1000
+    remaining = iter(full)
+    assert all(password in remaining for password in sample)  # a subsequence, in stage order
+
+
+def apply_rule(line, word):
+    """The hashcat/John rule functions --emit-rules uses, applied to word"""
+    functions = line.split(" ")
+    for function in functions:
+        if function == ":":
+            pass
+        elif function in ("l", "u", "c", "r"):
+            word = {"l": str.lower, "u": str.upper, "c": str.capitalize, "r": lambda w: w[::-1]}[function](word)
+        elif function == "T0":
+            word = word[:1].swapcase() + word[1:]
+        elif function[0] == "$":
+            word += function[1]
+        elif function[0] == "^":
+            word = function[1] + word
+        elif function[0] == "s":
+            word = word.replace(function[1], function[2])
+        else:
+            raise AssertionError(f"unexpected rule function {function}")
+    return word
+
+
+def test_emitted_rules_cover_the_expanded_passwords(tmp_path):
+    """--emit-rules base words and rules rebuild the single-word transforms"""
+    target = make_person()
+    output_file = str(tmp_path / "out.txt")
+    args = passforge.get_parser().parse_args(["-p", "-y", "-n", "-l", "--emit-rules"])
+    count = passforge.generate_passwords(target, output_file, args)
+    with open(output_file) as f:
+        words = f.read().split()
+    with open(str(tmp_path / "out.rule")) as f:
+        rules = f.read().splitlines()
+    with open(str(tmp_path / "out.static.txt")) as f:
+        static = f.read().split()
+    assert count == len(words) + len(static) and len(words) == 6
+    covered = {apply_rule(line, word) for line in rules for word in words}
+    for password in passforge.common_pwds + passforge.KEYBOARD_PATTERNS + list(passforge.temporal_passwords(target)):
+        assert password in static
+
+    expected = list(passforge.trivial_pwds(words, True, True)) + passforge.add_reverse_words(words)
+    for word in words:
+        expected += passforge.add_common_patterns(word) + passforge.add_special_multipliers(word)
+        expected += passforge.advanced_capitalization(word)[:4] + passforge.advanced_substitutions(word)
+    expected += list(passforge.leet_pwds(False, expected))
+    assert set(expected) <= covered
+
+
+def test_emitted_masks_cover_the_number_and_year_suffixes(tmp_path):
+    """--emit-masks: straight list + hybrid bases x masks cover a -y run"""
+    target = make_person()
+    parser = passforge.get_parser()
+    passforge.generate_passwords(target, str(tmp_path / "full.txt"), parser.parse_args(["-p", "-y", "-l"]))
+    output_file = str(tmp_path / "out.txt")
+    passforge.generate_passwords(target, output_file, parser.parse_args(["-p", "-y", "-l", "--emit-masks"]))
+
+    with open(str(tmp_path / "out.hcmask")) as f:
+        assert f.read().splitlines() == ["56789,198?1", "199?d"]
+    with open(str(tmp_path / "out.hybrid.txt")) as f:
+        bases = f.read().split()
+    with open(output_file) as f:
+        covered = set(f.read().split())
+    covered.update(base + year for base in bases for year in passforge.year_suffixes(True))
+    with open(str(tmp_path / "full.txt")) as f:
+        assert set(f.read().split()) <= covered
+    assert (tmp_path / "out.txt").stat().st_size + (tmp_path / "out.hybrid.txt").stat().st_size \
+        < (tmp_path / "full.txt").stat().st_size / 4
+
+
+def expand_mask(line):
+    """Every string a .hcmask line ([charset,]mask of digits and ?d/?1) matches"""
+    charset, _, mask = line.rpartition(",")
+    pools = []
+    for token in re.findall(r"\?.|[^?]", mask):
+        pools.append({"?d": "0123456789", "?1": charset}.get(token, token))
+    return ["".join(chars) for chars in itertools.product(*pools)]
+
+
+def test_emitted_masks_follow_each_stage_and_the_length_window(tmp_path, monkeypatch):
+    """--emit-masks groups bases by the masks they take, so hashcat adds no extra candidate"""
+    monkeypatch.setattr(passforge, "max_pwd_length", 10)
+    target = make_person()
+    parser = passforge.get_parser()
+    passforge.generate_passwords(target, str(tmp_path / "full.txt"), parser.parse_args(["-p", "-y", "-n"]))
+    output_file = str(tmp_path / "out.txt")
+    passforge.generate_passwords(target, output_file, parser.parse_args(["-p", "-y", "-n", "--emit-masks"]))
+
+    with open(output_file) as f:
+        covered = f.read().split()
+    groups = []
+    for group in itertools.count(1):
+        if group > 1 and not (tmp_path / f"out.hybrid-{group}.txt").exists():
+            break
+        with open(passforge.mask_path(output_file, group)) as f:
+            groups.append(f.read().split())
+        tails = [tail for line in groups[-1] for tail in expand_mask(line)]
+        with open(passforge.hybrid_path(output_file, group)) as f:
+            covered += [base + tail for base in f.read().split() for tail in tails]
+    assert ["1", "56789,198?1", "199?d"] in groups  # third round: starting number only
+    with open(str(tmp_path / "full.txt")) as f:
+        full = f.read().split()
+    assert set(covered) == set(full)
+    assert len(covered) <= len(full)
+
+
+def test_check_hashes_reports_matches_and_stops_early(tmp_path):
+    """--check-hashes finds MD5/SHA1/SHA256 digests and stops once all are cracked"""
+    hashes_file = tmp_path / "hashes.txt"
+    hashes_file.write_text("\n".join([
+        hashlib.md5(b"Alice!1").hexdigest(),
+        hashlib.sha1(b"password").hexdigest().upper(),
+        hashlib.sha256(b"alice.Johnson1990").hexdigest(),
+    ]) + "\n")
+    output_file = str(tmp_path / "cracked.txt")
+    args = passforge.get_parser().parse_args(["-p", "-y", "-n", "--check-hashes", str(hashes_file)])
+    count = passforge.generate_passwords(make_person(), output_file, args)
+
+    with open(output_file) as f:
+        cracked = dict(line.split(":", 1) for line in f.read().splitlines())
+    assert sorted(cracked.values()) == ["Alice!1", "alice.Johnson1990", "password"]
+    full = str(tmp_path / "full.txt")
+    assert count < passforge.generate_passwords(make_person(), full, passforge.get_parser().parse_args(["-p", "-y", "-n"]))
+
+
+def test_policy_filters_and_skips_stages(tmp_path, monkeypatch):
+    """--policy keeps exactly the compliant passwords and skips stages that cannot comply"""
+    policy = passforge.PasswordPolicy("upper,digit=2,symbol")
+    assert policy("Alice!19") and not policy("alice!19") and not policy("Alice!1")
+    assert passforge.PasswordPolicy("classes=3")("alice.1") and not passforge.PasswordPolicy("classes=3")("alice1")
+
+    target = make_person()
+    parser = passforge.get_parser()
+    passforge.generate_passwords(target, str(tmp_path / "full.txt"), parser.parse_args(["-p", "-y", "-l"]))
+    monkeypatch.setattr(passforge, "password_policy", "upper,digit,symbol")
+    attributes = passforge.attr_keywords_in_unique_list(target)
+    assert passforge.policy_skipped_stages(attributes, True, False, True) == {"common", "permutations_1"}
+    monkeypatch.setattr(passforge, "password_policy", "upper=0,digit")
+    assert "common" not in passforge.policy_skipped_stages(attributes, True, False, True)
+    monkeypatch.setattr(passforge, "password_policy", "upper,digit,symbol")
+    passforge.generate_passwords(target, str(tmp_path / "policy.txt"), parser.parse_args(["-p", "-y", "-l"]))
+
+    check = passforge.compiled_policy()
+    with open(str(tmp_path / "full.txt")) as f:
+        expected = sorted(password for password in f.read().split() if check(password))
+    with open(str(tmp_path / "policy.txt")) as f:
+        assert sorted(f.read().split()) == expected
+
+
+def test_parallel_rounds_are_copied_to_the_output(tmp_path, monkeypatch):
+    """--workers copies the shards as they are and writes the same bytes and stats"""
+    target = make_person()
+    monkeypatch.setattr(passforge, "min_pwd_length", 12)
+    outputs = []
+    for processes in (1, 2):
+        monkeypatch.setattr(passforge, "workers", processes)
+        output_file = str(tmp_path / f"out{processes}.txt")
+        stats_file = str(tmp_path / f"stats{processes}.json")
+        args = passforge.get_parser().parse_args(["-p", "-y", "-n", "--stats", stats_file])
+        passforge.generate_passwords(target, output_file, args)
+        with open(output_file, "rb") as f, open(stats_file) as g:
+            outputs.append((f.read(), [dict(stage, seconds=0) for stage in json.load(g)["stages"]]))
+    assert outputs[0] == outputs[1]
+
+
+def test_emit_masks_refuses_passphrases_over_the_guard(tmp_path, monkeypatch):
+    """--emit-masks checks the passphrase keyspace before writing any file"""
+    monkeypatch.setattr(passforge, "passphrase_words", 4)
+    monkeypatch.setattr(passforge, "passphrase_limit", 1000)
+    args = passforge.get_parser().parse_args(["-p", "-y", "--emit-masks"])
+    with pytest.raises(passforge.KeyspaceTooLarge):
+        passforge.generate_passwords(make_person(), str(tmp_path / "out.txt"), args)
+    assert list(tmp_path.iterdir()) == []
+    attributes = passforge.attr_keywords_in_unique_list(make_person())
+    with pytest.raises(passforge.KeyspaceTooLarge):
+        passforge.passphrases(attributes, False, False)